@@ -5,16 +5,17 @@ from pathlib import Path
 from contextlib import asynccontextmanager
 from typing import AsyncGenerator
 
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse, JSONResponse
+from fastapi.responses import StreamingResponse, Response
 
 # 保证项目根目录在路径上
 ROOT = Path(__file__).resolve().parents[2]
 if str(ROOT) not in sys.path:
     sys.path.append(str(ROOT))
 
-from mcp_hub import MCPHub
+from mcp_hub import MCPHub, json_dumps, sse_frame
+from mcp_sse import bounded_stream
 from model import MCPServerConfig, MCPToolCallRequest
 from utils.config_manager import ConfigManager
 
@@ -27,12 +28,17 @@ async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
     应用生命周期管理
     """
     print("应用启动中...")
+    # 共享的 httpx 客户端需在实际服务请求的事件循环上创建，挂到 app.state 上便于替换
+    app.state.http_client = hub.open_client()
     await hub.connect_all()
+    await hub.start_background_tasks(config_file=config_file)
 
     yield  # 这里应用运行
 
     # 关闭时执行的代码（相当于原来的 shutdown）
     print("应用关闭中...")
+    await hub.stop_background_tasks()
+    await hub.aclose()
 
 
 # ===================== MCPHub FastAPI 接口 =====================
@@ -72,32 +78,28 @@ if not config_file:
     print("⚠️  未找到配置文件，使用默认的本地MCP服务器配置")
     hub.add_server(MCPServerConfig(name="local", endpoint="http://localhost:8000/mcp"))
 
-@app.on_event("startup")
-async def startup_event():
-    await hub.start_background_tasks(config_file=config_file)
-
 @app.get("/mcp_hub/servers")
 async def list_servers():
-    return [
-        {"name": name, "endpoint": s.endpoint, "healthy": hub.health_status.get(name, False)}
-        for name, s in hub.servers.items()
-    ]
+    return Response(content=hub.servers_payload(), media_type="application/json")
 
 @app.get("/mcp_hub/tools")
 async def list_tools():
-    return {"tools": [t.schema for t in hub.tools.values()]}
+    return Response(content=hub.tools_payload(), media_type="application/json")
 
 @app.post("/mcp_hub/refresh")
 async def refresh_hub():
     await hub._reconcile_once()
     return {"refreshed": True}
 
+def orjson_response(content) -> Response:
+    return Response(content=json_dumps(content), media_type="application/json")
+
 @app.post("/mcp_hub/call")
 async def hub_call(data: MCPToolCallRequest):
     tool_name = data.function.get("name")
     arguments = data.function.get("arguments", {})
     result = await hub.call_tool(tool_name, arguments)
-    return JSONResponse(result)
+    return orjson_response(result)
 
 @app.post("/mcp_hub/approve")
 async def hub_approve(data: dict):
@@ -105,7 +107,10 @@ async def hub_approve(data: dict):
     arguments = data.get("arguments", {})
     approval_id = data.get("approval_id")
     result = await hub.approve_tool(tool_name, arguments, approval_id)
-    return JSONResponse(result)
+    return orjson_response(result)
+
+# 禁止代理（nginx）缓冲与缓存事件流，保证每个事件即时送达
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
 
 @app.post("/mcp_hub/call_stream")
 async def hub_call_stream(data: MCPToolCallRequest):
@@ -113,10 +118,23 @@ async def hub_call_stream(data: MCPToolCallRequest):
     arguments = data.function.get("arguments", {})
 
     async def event_generator():
-        async for chunk in hub.call_tool_stream(tool_name, arguments):
-            yield f"data: {chunk}\n\n"
+        async for chunk in bounded_stream(hub.call_tool_stream(tool_name, arguments)):
+            yield sse_frame(chunk)
+
+    return StreamingResponse(event_generator(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+@app.get("/mcp_hub/config")
+async def get_hub_config():
+    return {"max_inflight": hub.max_inflight, "inflight": hub.inflight}
 
-    return StreamingResponse(event_generator(), media_type="text/event-stream")
+@app.post("/mcp_hub/config")
+async def update_hub_config(data: dict):
+    if "max_inflight" in data:
+        value = data["max_inflight"]
+        if isinstance(value, bool) or not isinstance(value, int):
+            raise HTTPException(status_code=422, detail="max_inflight 必须为整数")
+        await hub.set_max_inflight(value)
+    return {"max_inflight": hub.max_inflight, "inflight": hub.inflight}
 
 @app.get("/mcp_hub/health")
 async def hub_health():
@@ -137,5 +155,17 @@ if __name__ == "__main__":
     # ⚡ 流式调用: POST http://localhost:{mcp_config.get("port")}/mcp_hub/call_stream
     #
     # """)
+    # uvloop / httptools 为可选依赖（Windows 上没有 uvloop），缺失时退回 uvicorn 默认实现
+    run_opts = {}
+    try:
+        import uvloop  # noqa: F401
+        run_opts["loop"] = "uvloop"
+    except ImportError:
+        pass
+    try:
+        import httptools  # noqa: F401
+        run_opts["http"] = "httptools"
+    except ImportError:
+        pass
     uvicorn.run(app, host="0.0.0.0", port=mcp_config.get("port"),
-                log_level="error")
+                log_level="error", **run_opts)
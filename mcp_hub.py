@@ -18,29 +18,157 @@ try:
     import yaml  # 可选
 except Exception:
     yaml = None
-from typing import Any, Dict, AsyncGenerator
+# 优先使用 libyaml 的 C 解析器，未编译 libyaml 时退回纯 Python 实现
+YAML_LOADER = getattr(yaml, "CSafeLoader", None) or getattr(yaml, "SafeLoader", None)
+try:
+    import orjson  # 可选，存在时用于加速JSON编解码
+except Exception:
+    orjson = None
+try:
+    import h2  # 可选，存在时共享客户端启用 HTTP/2 多路复用
+except Exception:
+    h2 = None
+from typing import Any, Callable, Dict, AsyncGenerator, Optional, Tuple
 import asyncio
+import itertools
 import time
 import hashlib
+import os
+import random
+from contextlib import asynccontextmanager
 
 import httpx
 
 from model import MCPServerConfig, ToolInfo, MCPServersConfig
+from mcp_sse import StreamFramer
+
+JSON_HEADERS = {"Content-Type": "application/json"}
+# 所有MCP服务器共享同一个连接池；keepalive 对齐 nginx 默认的 75s，避免频繁重建连接
+# HTTP/2 下多个流复用同一连接；只有 HTTP/1.1 时保留更多空闲连接，避免流式调用互相队头阻塞
+HTTP2_ENABLED = h2 is not None
+DEFAULT_LIMITS = httpx.Limits(max_connections=100,
+                              max_keepalive_connections=20 if HTTP2_ENABLED else 64,
+                              keepalive_expiry=75.0)
+
+
+def json_dumps(obj: Any) -> bytes:
+    """序列化为UTF-8 JSON字节，优先使用orjson"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False).encode("utf-8")
+
+
+def json_loads(data) -> Any:
+    """解析JSON（bytes或str），优先使用orjson"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def sse_frame(chunk: bytes) -> bytes:
+    """把一条消息编码为SSE事件；多行内容逐行加 data: 前缀，避免破坏事件边界"""
+    return b"data: " + chunk.replace(b"\n", b"\ndata: ") + b"\n\n"
+
+
+# 超过该大小的响应体放到线程中解析；小响应体线程切换的开销反而更大
+LARGE_PAYLOAD_BYTES = 256 * 1024
+
+
+async def json_loads_async(data) -> Any:
+    """解析可能很大的JSON响应体，避免长时间阻塞事件循环"""
+    if len(data) > LARGE_PAYLOAD_BYTES:
+        return await asyncio.to_thread(json_loads, data)
+    return json_loads(data)
+
+
+# JSON-RPC 请求体中不随调用变化的部分预先编码，按调用只拼接 id（以及 arguments）
+CALL_PREFIX = b'{"jsonrpc":"2.0","method":"tools/call","id":'
+APPROVE_PREFIX = b'{"jsonrpc":"2.0","method":"tools/approve","id":'
+INITIALIZE_PREFIX = b'{"jsonrpc":"2.0","method":"initialize","id":'
+INITIALIZE_TAIL = b',"params":{"clientInfo":{"name":"MCPHub","version":"1.0.0"},"capabilities":{}}}'
+TOOLS_LIST_PREFIX = b'{"jsonrpc":"2.0","method":"tools/list","id":'
+TOOLS_LIST_TAIL = b',"params":{}}'
+PING_PREFIX = b'{"jsonrpc":"2.0","method":"ping","id":'
+
+
+def rpc_body(prefix: bytes, req_id: int, tail: bytes = b"}") -> bytes:
+    return b"".join((prefix, str(req_id).encode(), tail))
+
+
+def tool_call_prefix(tool_name: str) -> bytes:
+    return b',"params":{"name":' + json_dumps(tool_name) + b',"arguments":'
+
+
+def build_call_body(req_id: int, call_prefix: bytes, arguments: Any) -> bytes:
+    """拼接 tools/call 请求体，只有 id 与 arguments 需要在调用时编码"""
+    return b"".join((CALL_PREFIX, str(req_id).encode(), call_prefix, json_dumps(arguments), b"}}"))
+
+
+def build_approve_body(req_id: int, call_prefix: bytes, arguments: Any, approval_id: str) -> bytes:
+    """拼接 tools/approve 请求体，params 与 tools/call 相同，另加 approval_id"""
+    return b"".join((APPROVE_PREFIX, str(req_id).encode(), call_prefix, json_dumps(arguments),
+                     b',"approval_id":', json_dumps(approval_id), b"}}"))
+
+
+def health_url(endpoint: str) -> Optional[str]:
+    """由 MCP 端点推导同一服务的 /health 地址（http://host/mcp -> http://host/health）"""
+    if "/mcp" in endpoint:
+        return endpoint.rsplit("/mcp", 1)[0] + "/health"
+    return None
+
+
+# ===================== 工具列表解析 =====================
+def parse_rpc_tools(data: Any) -> list:
+    """JSON-RPC 包装的响应：工具位于 result（列表）或 result.tools"""
+    try:
+        result = data["result"]
+        return result if isinstance(result, list) else result.get("tools") or []
+    except (KeyError, TypeError, AttributeError):
+        return []
+
+
+def parse_bare_tools(data: Any) -> list:
+    """未包装的响应：tools/list 直接返回列表，initialize 直接返回含 tools 的对象"""
+    try:
+        return data if isinstance(data, list) else data.get("tools") or []
+    except AttributeError:
+        return []
+
+
+def select_tools_parser(init_data: Any) -> Callable[[Any], list]:
+    if isinstance(init_data, dict) and ("jsonrpc" in init_data or "result" in init_data):
+        return parse_rpc_tools
+    return parse_bare_tools
 
 
 # ===================== MCPHub - 智能枢纽 =====================
 class MCPHub:
-    def __init__(self, config_file: str = None):
+    def __init__(self, config_file: str = None, max_inflight: int = 32, warm_connections: int = 2):
         self.servers: Dict[str, MCPServerConfig] = {}
-        self.clients: Dict[str, httpx.AsyncClient] = {}
-        self.tools: Dict[str, ToolInfo] = {}
+        self.client: Optional[httpx.AsyncClient] = None
+        self.tools: Dict[Tuple[str, str], ToolInfo] = {}  # (server_name, tool_name) -> ToolInfo
+        self._tools_by_server: Dict[str, set] = {}  # server_name -> {tool_name}，断开时按服务器批量移除
         self.health_status: Dict[str, bool] = {}
-        self.request_ids: Dict[str, int] = {}
-        self._lock = asyncio.Lock()
+        self.request_ids: Dict[str, Callable[[], int]] = {}  # 每个服务器一个递增ID生成器
         self._config_file = config_file
         self._bg_task = None
+        self._probe_task = None
         self._retry_info: Dict[str, Dict[str, Any]] = {}
         self._last_config_hash = None
+        self._last_config_stat: Optional[Tuple[int, int]] = None  # (mtime_ns, size)
+        self._no_batch: set = set()  # 不支持 JSON-RPC batch 的服务器地址（按 endpoint 记录，断线重连后仍然有效）
+        self._tools_parsers: Dict[str, Callable[[Any], list]] = {}
+        self._health_urls: Dict[str, Optional[str]] = {}  # 登记服务器时由端点推导一次
+        self._no_head: set = set()  # /health 不支持 HEAD 的服务器，改用 GET
+        # /tools 与 /servers 的预序列化响应，工具或服务器状态变化时失效
+        self._tools_payload: Optional[bytes] = None
+        self._servers_payload: Optional[bytes] = None
+        # 准入控制：限制同时进行的上游调用数，max_inflight 可在运行时调整
+        self.max_inflight = max_inflight
+        self._inflight = 0
+        self._cv = asyncio.Condition()
+        # 连接成功后为每个服务器预热的连接数，约等于预期的单服务器并行度
+        self.warm_connections = warm_connections
 
         if config_file:
             self.load_config(config_file)
@@ -48,13 +176,15 @@ class MCPHub:
     def load_config(self, config_file: str):
         """从配置文件加载MCP服务器配置"""
         try:
-            with open(config_file, 'r', encoding='utf-8') as f:
-                if (config_file.endswith('.yaml') or config_file.endswith('.yml')):
-                    if yaml is None:
-                        raise ImportError("需要PyYAML来解析YAML配置文件，请安装 'pyyaml' 或改用JSON配置")
-                    config_data = yaml.safe_load(f)
-                else:
-                    config_data = json.load(f)
+            stat = self._config_stat(config_file)
+            with open(config_file, 'rb') as f:
+                raw = f.read()
+            if (config_file.endswith('.yaml') or config_file.endswith('.yml')):
+                if yaml is None:
+                    raise ImportError("需要PyYAML来解析YAML配置文件，请安装 'pyyaml' 或改用JSON配置")
+                config_data = yaml.load(raw, Loader=YAML_LOADER)
+            else:
+                config_data = json_loads(raw)
             
             # 支持两种格式：直接列表格式和包含servers字段的对象格式
             if isinstance(config_data, list):
@@ -69,49 +199,149 @@ class MCPHub:
             for server_config in servers_config.servers:
                 self.add_server(server_config)
                 
+            # 记下被监视文件的指纹，后台对账首次执行时内容未变即可直接跳过解析
+            if config_file == self._config_file:
+                self._last_config_hash = self._config_hash(raw)
+                self._last_config_stat = stat
             print(f"✅ 成功加载配置文件: {config_file}, 共 {len(servers_config.servers)} 个MCP服务器")
         except Exception as e:
             print(f"❌ 加载配置文件失败: {e}")
             raise
 
+    def open_client(self) -> httpx.AsyncClient:
+        """创建（或复用）共享的 httpx.AsyncClient，应在服务事件循环中调用"""
+        if self.client is None or self.client.is_closed:
+            self.client = httpx.AsyncClient(http2=HTTP2_ENABLED, limits=DEFAULT_LIMITS, timeout=httpx.Timeout(30.0))
+        return self.client
+
+    async def aclose(self):
+        """关闭共享客户端"""
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    @asynccontextmanager
+    async def _admit(self):
+        """获取一个上游调用名额，名额用尽时等待其他调用结束"""
+        async with self._cv:
+            await self._cv.wait_for(lambda: self._inflight < self.max_inflight)
+            self._inflight += 1
+        try:
+            yield
+        finally:
+            async with self._cv:
+                self._inflight -= 1
+                self._cv.notify(1)
+
+    @property
+    def inflight(self) -> int:
+        """当前正在进行的上游调用数"""
+        return self._inflight
+
+    async def set_max_inflight(self, value: int):
+        """调整并发上限；调大时唤醒所有等待者，调小时已占用的名额自然释放"""
+        async with self._cv:
+            self.max_inflight = max(1, value)
+            self._cv.notify_all()
+
     def add_server(self, config: MCPServerConfig):
-        self.servers[config.name] = config
+        # servers / tools 采用写时复制：写入方整体替换字典，读取方无需加锁也不会看到半更新状态
+        servers = dict(self.servers)
+        servers[config.name] = config
+        self.servers = servers
         self.health_status[config.name] = False
-        self.request_ids[config.name] = 0
+        self._servers_payload = None
+        self.request_ids[config.name] = itertools.count(1).__next__
+        self._health_urls[config.name] = health_url(config.endpoint)
+
+    def _set_health(self, name: str, healthy: bool):
+        if self.health_status.get(name) != healthy:
+            self._servers_payload = None
+        self.health_status[name] = healthy
+
+    def tools_payload(self) -> bytes:
+        """序列化后的工具列表，仅在工具集合变化后重建"""
+        if self._tools_payload is None:
+            self._tools_payload = json_dumps({"tools": [t.schema for t in self.tools.values()]})
+        return self._tools_payload
+
+    def servers_payload(self) -> bytes:
+        """序列化后的服务器列表，仅在服务器或健康状态变化后重建"""
+        if self._servers_payload is None:
+            self._servers_payload = json_dumps([
+                {"name": name, "endpoint": s.endpoint, "healthy": self.health_status.get(name, False)}
+                for name, s in self.servers.items()
+            ])
+        return self._servers_payload
 
     def _next_id(self, server_name: str) -> int:
-        self.request_ids[server_name] += 1
-        return self.request_ids[server_name]
+        return self.request_ids[server_name]()
 
     async def connect_all(self):
-        """连接所有启用的服务器并发现工具"""
-        for name, config in self.servers.items():
-            if config.enabled:
-                await self._connect_server(name, config)
-
-    async def start_background_tasks(self, config_file: str = None, interval: int = 300):
+        """并发连接所有启用的服务器并发现工具，单个服务器失败不影响其他服务器"""
+        await asyncio.gather(
+            *(self._connect_server(name, config) for name, config in list(self.servers.items()) if config.enabled),
+            return_exceptions=True
+        )
+
+    async def start_background_tasks(self, config_file: str = None, interval: int = 300,
+                                     probe_interval: float = 5.0):
         if config_file:
             self._config_file = config_file
         if self._bg_task is None:
             self._bg_task = asyncio.create_task(self._reconcile_loop(interval))
+        if self._probe_task is None:
+            self._probe_task = asyncio.create_task(self._probe_loop(probe_interval))
+
+    async def stop_background_tasks(self):
+        tasks = [t for t in (self._bg_task, self._probe_task) if t is not None]
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._bg_task = None
+        self._probe_task = None
+
+    async def _probe_loop(self, base_interval: float, max_interval: float = 60.0):
+        """周期性健康探测：全部健康时按基础间隔探测，有服务器异常时间隔指数退避至 max_interval"""
+        interval = base_interval
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                all_healthy = await self._check_health()
+            except Exception:
+                all_healthy = False
+            interval = base_interval if all_healthy else min(interval * 2, max_interval)
 
     async def _reconcile_loop(self, interval: int):
+        """按固定节拍对账：以单调时钟上的绝对截止时间调度，单次耗时不会累积成漂移"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time()
         while True:
             try:
                 await self._reconcile_once()
             except Exception:
+                # CancelledError 不是 Exception 的子类，停止后台任务时照常向上传播
                 pass
-            await asyncio.sleep(interval)
+            deadline += interval
+            now = loop.time()
+            if deadline < now:
+                deadline = now  # 单次耗时超过一个周期时不补跑错过的节拍
+            await asyncio.sleep(deadline - now)
 
-    def _load_config_snapshot(self) -> Dict[str, MCPServerConfig]:
-        snapshot: Dict[str, MCPServerConfig] = {}
+    def _read_config_bytes(self) -> bytes:
         if not self._config_file:
+            return b""
+        with open(self._config_file, 'rb') as f:
+            return f.read()
+
+    def _load_config_snapshot(self, raw: bytes) -> Dict[str, MCPServerConfig]:
+        snapshot: Dict[str, MCPServerConfig] = {}
+        if not raw:
             return snapshot
-        with open(self._config_file, 'r', encoding='utf-8') as f:
-            if self._config_file.endswith('.yaml') or self._config_file.endswith('.yml'):
-                data = yaml.safe_load(f)
-            else:
-                data = json.load(f)
+        if self._config_file.endswith('.yaml') or self._config_file.endswith('.yml'):
+            data = yaml.load(raw, Loader=YAML_LOADER)
+        else:
+            data = json_loads(raw)
         if isinstance(data, list):
             for s in data:
                 cfg = MCPServerConfig(**s)
@@ -125,69 +355,88 @@ class MCPHub:
             snapshot[cfg.name] = cfg
         return snapshot
 
-    def _snapshot_hash(self, snap: Dict[str, MCPServerConfig]) -> str:
-        items = sorted([(n, c.endpoint, c.enabled, c.timeout) for n, c in snap.items()])
-        raw = json.dumps(items, ensure_ascii=False)
-        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+    @staticmethod
+    def _config_hash(raw: bytes) -> str:
+        # 仅用于变更检测，直接对原始文件字节做 BLAKE2b 摘要，无需再序列化派生结构
+        return hashlib.blake2b(raw, digest_size=8).hexdigest()
+
+    def _config_stat(self, path: str = None) -> Optional[Tuple[int, int]]:
+        path = path or self._config_file
+        if not path:
+            return None
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
 
     async def _reconcile_once(self):
-        snap = self._load_config_snapshot()
-        snap_hash = self._snapshot_hash(snap)
-        current_names = set(self.servers.keys())
-        snap_names = set(snap.keys())
-        added = snap_names - current_names
-        removed = current_names - snap_names if self._config_file else set()
-        common = current_names & snap_names
-        changed = set()
-        for n in common:
-            c1 = self.servers[n]
-            c2 = snap[n]
-            if c1.endpoint != c2.endpoint or c1.enabled != c2.enabled or c1.timeout != c2.timeout:
-                changed.add(n)
+        # 配置文件的 mtime 与大小都没变时跳过读取和解析，只做健康检查
+        stat = self._config_stat()
+        if stat is not None and stat == self._last_config_stat:
+            await self._check_health()
+            return
+        raw = self._read_config_bytes()
+        snap_hash = self._config_hash(raw)
+        # 文件被 touch 但内容未变：摘要相同，无需解析
         if self._last_config_hash != snap_hash:
-            for n in added:
-                cfg = snap[n]
-                async with self._lock:
-                    self.add_server(cfg)
-                if cfg.enabled:
-                    await self._connect_server(n, cfg)
-            for n in removed:
-                await self._disconnect_server(n)
-            for n in changed:
-                cfg = snap[n]
-                if not cfg.enabled:
-                    await self._disconnect_server(n)
-                else:
-                    await self._disconnect_server(n)
-                    async with self._lock:
-                        self.servers[n] = cfg
-                    await self._connect_server(n, cfg)
+            snap = self._load_config_snapshot(raw)
+            current_names = set(self.servers.keys())
+            snap_names = set(snap.keys())
+            added = snap_names - current_names
+            removed = current_names - snap_names if self._config_file else set()
+            changed = set()
+            for n in current_names & snap_names:
+                c1 = self.servers[n]
+                c2 = snap[n]
+                if c1.endpoint != c2.endpoint or c1.enabled != c2.enabled or c1.timeout != c2.timeout:
+                    changed.add(n)
+            # 各服务器互不依赖，增删改并发执行，总耗时取决于最慢的一个
+            tasks = [self._apply_server(snap[n], replace=False) for n in added]
+            tasks += [self._disconnect_server(n) for n in removed]
+            tasks += [self._apply_server(snap[n], replace=True) for n in changed]
+            await asyncio.gather(*tasks, return_exceptions=True)
             self._last_config_hash = snap_hash
-        for n in list(self.servers.keys()):
-            if not self.servers[n].enabled:
+        self._last_config_stat = stat
+        await self._check_health()
+
+    async def _apply_server(self, cfg: MCPServerConfig, replace: bool):
+        """登记（或替换）一个服务器配置，启用时随即连接"""
+        if replace:
+            await self._disconnect_server(cfg.name)
+        self.add_server(cfg)
+        if cfg.enabled:
+            await self._connect_server(cfg.name, cfg)
+
+    async def _check_health(self) -> bool:
+        """并发探测所有启用的服务器：健康的做心跳，不健康的按退避重连；返回是否全部健康"""
+        tasks = []
+        for n, cfg in list(self.servers.items()):
+            if not cfg.enabled:
                 continue
-            healthy = self.health_status.get(n, False)
-            if not healthy:
-                await self._reconnect_server(n)
+            if self.health_status.get(n, False):
+                tasks.append(self._ping_health(n))
             else:
-                await self._ping_health(n)
+                tasks.append(self._reconnect_server(n))
+        await asyncio.gather(*tasks, return_exceptions=True)
+        return all(self.health_status.get(n, False) for n, cfg in self.servers.items() if cfg.enabled)
 
     async def _disconnect_server(self, name: str):
-        client = self.clients.get(name)
-        if client:
-            try:
-                await client.aclose()
-            except Exception:
-                pass
-        async with self._lock:
-            self.clients.pop(name, None)
-            self.health_status[name] = False
-            to_remove = [k for k, v in self.tools.items() if v.server_name == name]
-            for k in to_remove:
-                self.tools.pop(k, None)
-            self.servers.pop(name, None)
-            self.request_ids.pop(name, None)
-            self._retry_info.pop(name, None)
+        self._set_health(name, False)
+        tools = dict(self.tools)
+        for tool_name in self._tools_by_server.pop(name, ()):
+            tools.pop((name, tool_name), None)
+        self.tools = tools
+        self._tools_payload = None
+        servers = dict(self.servers)
+        servers.pop(name, None)
+        self.servers = servers
+        self._servers_payload = None
+        self.request_ids.pop(name, None)
+        self._retry_info.pop(name, None)
+        self._tools_parsers.pop(name, None)
+        self._health_urls.pop(name, None)
+        self._no_head.discard(name)
 
     async def _reconnect_server(self, name: str):
         cfg = self.servers.get(name)
@@ -198,110 +447,154 @@ class MCPHub:
         if now < info["next"]:
             return
         attempt = info["attempt"] + 1
-        delay = min(60, 2 ** min(attempt, 6))
-        try:
-            await self._connect_server(name, cfg)
+        if await self._connect_server(name, cfg):
             self._retry_info[name] = {"attempt": 0, "next": 0}
-        except Exception:
+        else:
+            # 全抖动退避：在 [0, 上限] 内随机取等待时间，避免多个服务器同步重连形成突发
+            delay = random.uniform(0, min(60, 2 ** min(attempt, 6)))
             self._retry_info[name] = {"attempt": attempt, "next": now + delay}
 
     async def _ping_health(self, name: str):
-        client = self.clients.get(name)
+        client = self.client
         cfg = self.servers.get(name)
         if not client or not cfg:
             return
-        url = None
-        if "/mcp" in cfg.endpoint:
-            base = cfg.endpoint.rsplit("/mcp", 1)[0]
-            url = base + "/health"
-        if not url:
-            return
+        url = self._health_urls.get(name)
         try:
-            resp = await client.get(url)
+            if url and name in self._no_head:
+                resp = await client.get(url, timeout=cfg.timeout)
+            elif url:
+                # 只关心状态码，HEAD 省去响应体；不支持 HEAD 的服务器记下后改用 GET
+                resp = await client.head(url, timeout=cfg.timeout)
+                if resp.status_code in (405, 501):
+                    self._no_head.add(name)
+                    resp = await client.get(url, timeout=cfg.timeout)
+            else:
+                # 没有 /health 地址时发送 JSON-RPC ping，只关心服务器能否应答
+                ping = rpc_body(PING_PREFIX, self._next_id(name))
+                resp = await client.post(cfg.endpoint, content=ping, headers=JSON_HEADERS,
+                                         timeout=cfg.timeout)
             if resp.status_code != 200:
-                self.health_status[name] = False
+                self._set_health(name, False)
         except Exception:
-            self.health_status[name] = False
+            self._set_health(name, False)
 
-    async def _connect_server(self, name: str, config: MCPServerConfig):
-        client = httpx.AsyncClient(timeout=config.timeout)
-        try:
-            payload = {
-                "jsonrpc": "2.0",
-                "id": self._next_id(name),
-                "method": "initialize",
-                "params": {
-                    "clientInfo": {"name": "MCPHub", "version": "1.0.0"},
-                    "capabilities": {}
-                }
-            }
-            resp = await client.post(config.endpoint, json=payload)
-            resp.raise_for_status()
+    async def _handshake(self, name: str, config: MCPServerConfig, client: httpx.AsyncClient):
+        """发送 initialize 与 tools/list，返回 (initialize响应, tools/list响应或None)
 
-            # 处理响应
+        优先以 JSON-RPC batch 合并为一次请求；服务器不支持 batch 时回退为两次并发请求，
+        并按 endpoint 记住不支持 batch，之后的连接与重连直接走回退路径。
+        """
+        init_id = self._next_id(name)
+        list_id = self._next_id(name)
+        init_body = rpc_body(INITIALIZE_PREFIX, init_id, INITIALIZE_TAIL)
+        list_body = rpc_body(TOOLS_LIST_PREFIX, list_id, TOOLS_LIST_TAIL)
+
+        if config.endpoint not in self._no_batch:
             try:
-                init_data = resp.json()
-                # 检查是否为错误响应
-                if isinstance(init_data, dict) and "error" in init_data:
-                    error_info = init_data["error"]
-                    error_message = error_info.get("message", str(error_info)) if isinstance(error_info, dict) else str(error_info)
-                    raise Exception(f"初始化失败: {error_message}")
-            except json.JSONDecodeError as e:
-                raise Exception(f"响应解析失败: {str(e)}")
-
-            self.clients[name] = client
-            self.health_status[name] = True
-            # 尝试从initialize响应中提取工具信息
-            tools_from_init = []
-            if isinstance(init_data, dict) and "result" in init_data:
-                result = init_data["result"]
-                if isinstance(result, dict) and "tools" in result:
-                    tools_from_init = result["tools"]
+                resp = await client.post(config.endpoint, content=b"[" + init_body + b"," + list_body + b"]",
+                                         headers=JSON_HEADERS, timeout=config.timeout)
+                if resp.status_code == 200:
+                    data = await json_loads_async(resp.content)
+                    if isinstance(data, list):
+                        by_id = {item.get("id"): item for item in data if isinstance(item, dict)}
+                        if init_id in by_id:
+                            return by_id[init_id], by_id.get(list_id)
+            except httpx.TransportError:
+                # 网络层错误与是否支持batch无关，直接视为连接失败
+                raise
+            except Exception:
+                pass
+            self._no_batch.add(config.endpoint)
+
+        # initialize 与 tools/list 互不依赖，并发发出以省去一次往返
+        resp, list_resp = await asyncio.gather(
+            client.post(config.endpoint, content=init_body, headers=JSON_HEADERS,
+                        timeout=config.timeout),
+            client.post(config.endpoint, content=list_body, headers=JSON_HEADERS,
+                        timeout=config.timeout),
+            return_exceptions=True
+        )
+        if isinstance(resp, BaseException):
+            raise resp
+        resp.raise_for_status()
+        try:
+            # initialize 响应可能内嵌完整工具列表，与 tools/list 一样按大小决定是否移出事件循环解码
+            init_data = await json_loads_async(resp.content)
+        except json.JSONDecodeError as e:
+            raise Exception(f"响应解析失败: {str(e)}")
+
+        list_data = None
+        try:
+            if isinstance(list_resp, BaseException):
+                raise list_resp
+            list_resp.raise_for_status()
+            list_data = await json_loads_async(list_resp.content)
+        except Exception as e:
+            print(f"⚠️  工具发现失败: {e}")
+        return init_data, list_data
+
+    async def _connect_server(self, name: str, config: MCPServerConfig) -> bool:
+        """连接服务器并发现工具，失败时标记不健康并返回 False，不抛出异常"""
+        client = self.open_client()
+        try:
+            init_data, list_data = await self._handshake(name, config, client)
+
+            # 检查是否为错误响应
+            if isinstance(init_data, dict) and "error" in init_data:
+                error_info = init_data["error"]
+                error_message = error_info.get("message", str(error_info)) if isinstance(error_info, dict) else str(error_info)
+                raise Exception(f"初始化失败: {error_message}")
+
+            # 以下写入之间没有 await，在事件循环内天然原子；握手期间配置已被替换或移除则丢弃本次结果
+            if self.servers.get(name) is not config:
+                return True
+            self._set_health(name, True)
+            # 根据 initialize 响应的形态为该服务器选定工具列表解析器，之后的发现都直接复用
+            parser = select_tools_parser(init_data)
+            self._tools_parsers[name] = parser
             # 调用工具发现方法
-            await self._discover_tools(name, config, client, tools_from_init)
+            self._discover_tools(name, parser(init_data), list_data)
+            await self._prewarm(name, config, client)
             print(f"✅ 服务器 {name} 连接成功")
+            return True
         except Exception as e:
-            self.health_status[name] = False
-            await client.aclose()
+            self._set_health(name, False)
             print(f"❌ 服务器 {name} 连接失败: {e}")
+            return False
 
-    async def _discover_tools(self, server_name: str, config: MCPServerConfig, client: httpx.AsyncClient, tools_from_init: list = None):
+    async def _prewarm(self, name: str, config: MCPServerConfig, client: httpx.AsyncClient):
+        """并发发出几个轻量请求，让连接池里提前备好该服务器的空闲连接，首个真实调用无需握手"""
+        url = self._health_urls.get(name)
+        if not url or self.warm_connections <= 1:
+            return
+        if HTTP2_ENABLED and url.startswith("https://"):
+            return  # HTTP/2 下所有请求复用同一连接，无需额外预热
+        await asyncio.gather(
+            *(client.head(url, timeout=config.timeout) for _ in range(self.warm_connections)),
+            return_exceptions=True
+        )
+
+    def _discover_tools(self, server_name: str, tools_from_init: list = None, list_data: Any = None):
+        """根据已解码的 initialize / tools/list 响应注册工具"""
         # 首先使用从initialize响应中获取的工具信息
-        if tools_from_init and len(tools_from_init) > 0:
+        if tools_from_init:
             self._process_tool_list(server_name, tools_from_init)
             print(f"✅ 从initialize响应中发现 {len(tools_from_init)} 个工具")
             return
+        if list_data is None:
+            return
 
-        # 如果没有从initialize获取到工具，则调用tools/list方法
-        try:
-            payload = {
-                "jsonrpc": "2.0",
-                "id": self._next_id(server_name),
-                "method": "tools/list",
-                "params": {}
-            }
-            resp = await client.post(config.endpoint, json=payload)
-            resp.raise_for_status()
-            data = resp.json()
-
-            # 兼容返回 result 是列表或字典
-            result_list = []
-            if isinstance(data, dict):
-                result = data.get("result", [])
-                if isinstance(result, list):
-                    result_list = result
-                elif isinstance(result, dict) and "tools" in result:
-                    result_list = result["tools"]
-            elif isinstance(data, list):
-                result_list = data
-
-            self._process_tool_list(server_name, result_list)
-            print(f"✅ 从tools/list发现 {len(result_list)} 个工具")
-        except Exception as e:
-            print(f"⚠️  工具发现失败: {e}")
+        result_list = self._tools_parsers.get(server_name, parse_rpc_tools)(list_data)
+        self._process_tool_list(server_name, result_list)
+        print(f"✅ 从tools/list发现 {len(result_list)} 个工具")
 
     def _process_tool_list(self, server_name: str, tools: list):
         """处理工具列表，构建工具信息"""
+        config = self.servers[server_name]
+        names = self._tools_by_server.setdefault(server_name, set())
+        next_id = self.request_ids[server_name]
+        new_tools = dict(self.tools)
         for tool in tools:
             # 处理标准MCP格式的工具定义
             if isinstance(tool, dict):
@@ -317,50 +610,58 @@ class MCPHub:
                     continue
 
                 if tool_name:
-                    # 构建符合 OpenAPI 标准的 schema 格式
-                    openapi_schema = {
-                        "type": "function",
-                        "function": func.copy()  # 复制原始 function 对象
-                    }
-                    # 修改 function 内部的 name 为完整名称
-                    openapi_schema["function"]["name"] = f"{server_name}.{tool_name}"
-
-                    self.tools[f"{server_name}.{tool_name}"] = ToolInfo(
+                    full_name = f"{server_name}.{tool_name}"
+                    # 构建符合 OpenAPI 标准的 schema 格式，function 内部的 name 替换为完整名称
+                    openapi_schema = {"type": "function", "function": {**func, "name": full_name}}
+
+                    new_tools[(server_name, tool_name)] = ToolInfo(
                         name=tool_name,
                         server_name=server_name,
-                        schema=openapi_schema
+                        schema=openapi_schema,
+                        call_prefix=tool_call_prefix(tool_name),
+                        endpoint=config.endpoint,
+                        timeout=config.timeout,
+                        full_name=full_name,
+                        next_id=next_id
                     )
+                    names.add(tool_name)
+        self.tools = new_tools
+        self._tools_payload = None
+
+    def _get_tool(self, full_tool_name: str) -> Optional[ToolInfo]:
+        """按 "<server>.<tool>" 查找工具，内部以 (server, tool) 元组为键
+
+        服务器名或工具名本身可能含 "."（如 my.server），首个 "." 未命中时依次尝试后面的分割位置。
+        """
+        name = full_tool_name or ""
+        idx = name.find(".")
+        while idx >= 0:
+            tool = self.tools.get((name[:idx], name[idx + 1:]))
+            if tool is not None:
+                return tool
+            idx = name.find(".", idx + 1)
+        return None
 
     async def call_tool(self, full_tool_name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
         """调用工具（同步结果）"""
-        if full_tool_name not in self.tools:
+        tool = self._get_tool(full_tool_name)
+        if tool is None:
             return {"success": False, "error": f"工具 {full_tool_name} 不存在"}
 
-        tool = self.tools[full_tool_name]
         server_name = tool.server_name
         if not self.health_status.get(server_name, False):
             return {"success": False, "error": f"服务器 {server_name} 不可用"}
 
-        client = self.clients[server_name]
-        payload = {
-            "jsonrpc": "2.0",
-            "id": self._next_id(server_name),
-            "method": "tools/call",
-            "params": {
-                "name": tool.name,
-                "arguments": arguments
-            }
-        }
+        client = self.open_client()
+        body = build_call_body(tool.next_id(), tool.call_prefix, arguments)
 
         try:
-            resp = await client.post(self.servers[server_name].endpoint, json=payload)
+            async with self._admit():
+                resp = await client.post(tool.endpoint, content=body, headers=JSON_HEADERS,
+                                         timeout=tool.timeout)
             resp.raise_for_status()
             # Streamable MCP 也可能返回列表或字典
-            try:
-                data = resp.json()
-            except Exception:
-                text = await resp.aread()
-                data = json.loads(text.decode())
+            data = await json_loads_async(resp.content)
 
             # 标准JSON-RPC响应处理
             if isinstance(data, dict):
@@ -387,35 +688,24 @@ class MCPHub:
 
     async def approve_tool(self, full_tool_name: str, arguments: Dict[str, Any], approval_id: str) -> Dict[str, Any]:
         """批准工具执行"""
-        if full_tool_name not in self.tools:
+        tool = self._get_tool(full_tool_name)
+        if tool is None:
             return {"success": False, "error": f"工具 {full_tool_name} 不存在"}
 
-        tool = self.tools[full_tool_name]
         server_name = tool.server_name
         if not self.health_status.get(server_name, False):
             return {"success": False, "error": f"服务器 {server_name} 不可用"}
 
-        client = self.clients[server_name]
-        payload = {
-            "jsonrpc": "2.0",
-            "id": self._next_id(server_name),
-            "method": "tools/approve",
-            "params": {
-                "name": tool.name,
-                "arguments": arguments,
-                "approval_id": approval_id
-            }
-        }
+        client = self.open_client()
+        body = build_approve_body(tool.next_id(), tool.call_prefix, arguments, approval_id)
 
         try:
-            resp = await client.post(self.servers[server_name].endpoint, json=payload)
+            async with self._admit():
+                resp = await client.post(tool.endpoint, content=body, headers=JSON_HEADERS,
+                                         timeout=tool.timeout)
             resp.raise_for_status()
             # Streamable MCP 也可能返回列表或字典
-            try:
-                data = resp.json()
-            except Exception:
-                text = await resp.aread()
-                data = json.loads(text.decode())
+            data = await json_loads_async(resp.content)
 
             # 标准JSON-RPC响应处理
             if isinstance(data, dict):
@@ -432,88 +722,70 @@ class MCPHub:
         except Exception as e:
             return {"success": False, "error": str(e)}
 
-    async def call_tool_stream(self, full_tool_name: str, arguments: Dict[str, Any]) -> AsyncGenerator[str, None]:
-        """流式调用工具（SSE / Streamable MCP）"""
-        if full_tool_name not in self.tools:
-            yield json.dumps({"success": False, "error": f"工具 {full_tool_name} 不存在"})
+    async def call_tool_stream(self, full_tool_name: str, arguments: Dict[str, Any]) -> AsyncGenerator[bytes, None]:
+        """流式调用工具（SSE / Streamable MCP），逐条产出已编码的消息字节，由调用方直接写出"""
+        tool = self._get_tool(full_tool_name)
+        if tool is None:
+            yield json_dumps({"success": False, "error": f"工具 {full_tool_name} 不存在"})
             return
 
-        tool = self.tools[full_tool_name]
         server_name = tool.server_name
         if not self.health_status.get(server_name, False):
-            yield json.dumps({"success": False, "error": f"服务器 {server_name} 不可用"})
+            yield json_dumps({"success": False, "error": f"服务器 {server_name} 不可用"})
             return
 
-        client = self.clients[server_name]
-        payload = {
-            "jsonrpc": "2.0",
-            "id": self._next_id(server_name),
-            "method": "tools/call",
-            "params": {
-                "name": tool.name,
-                "arguments": arguments
-            }
-        }
+        client = self.open_client()
+        body = build_call_body(tool.next_id(), tool.call_prefix, arguments)
 
         try:
-            async with client.stream("POST", self.servers[server_name].endpoint, json=payload) as resp:
-                if resp.status_code != 200:
-                    error_msg = f"HTTP错误: {resp.status_code}"
-                    yield json.dumps({"success": False, "error": error_msg})
-                    return
-
-                buffer = ""
-                async for chunk in resp.aiter_bytes():
-                    if chunk:
+            async with self._admit():
+                async with client.stream("POST", tool.endpoint, content=body,
+                                         headers=JSON_HEADERS, timeout=tool.timeout) as resp:
+                    if resp.status_code != 200:
+                        error_msg = f"HTTP错误: {resp.status_code}"
+                        yield json_dumps({"success": False, "error": error_msg})
+                        return
+
+                    framer = StreamFramer()
+                    async for chunk in resp.aiter_bytes():
+                        if not chunk:
+                            continue
                         try:
-                            text = chunk.decode("utf-8")
-                            buffer += text
-
-                            # 按行处理响应
-                            lines = buffer.split('\n')
-                            buffer = lines[-1]  # 保留最后不完整的行
-
-                            for line in lines[:-1]:
-                                line = line.strip()
-                                if line:
-                                    # 处理标准MCP流式响应格式
-                                    try:
-                                        chunk_data = json.loads(line)
-                                        # 检查是否为错误响应
-                                        if isinstance(chunk_data, dict):
-                                            if "error" in chunk_data:
-                                                error_info = chunk_data["error"]
-                                                error_message = error_info.get("message", str(error_info)) if isinstance(error_info, dict) else str(error_info)
-                                                yield json.dumps({"success": False, "error": error_message})
-                                                return
-                                            elif "result" in chunk_data:
-                                                # 标准JSON-RPC成功响应
-                                                yield json.dumps({"success": True, "result": chunk_data["result"]})
-                                            else:
-                                                # 其他格式的响应
-                                                yield line
-                                    except json.JSONDecodeError:
-                                        # 非JSON格式，直接返回
-                                        yield line
+                            for frame in framer.feed(chunk):
+                                message, done = self._stream_message(frame)
+                                yield message
+                                if done:
+                                    return
                         except Exception as e:
-                            yield json.dumps({"success": False, "error": f"流式处理错误: {str(e)}"})
+                            yield json_dumps({"success": False, "error": f"流式处理错误: {str(e)}"})
                             return
 
-                # 处理最后剩余的缓冲区内容
-                if buffer.strip():
-                    try:
-                        chunk_data = json.loads(buffer)
-                        if isinstance(chunk_data, dict):
-                            if "error" in chunk_data:
-                                error_info = chunk_data["error"]
-                                error_message = error_info.get("message", str(error_info)) if isinstance(error_info, dict) else str(error_info)
-                                yield json.dumps({"success": False, "error": error_message})
-                            elif "result" in chunk_data:
-                                yield json.dumps({"success": True, "result": chunk_data["result"]})
-                            else:
-                                yield buffer
-                    except json.JSONDecodeError:
-                        yield buffer
+                    # 处理最后剩余的缓冲区内容
+                    for frame in framer.flush():
+                        message, done = self._stream_message(frame)
+                        yield message
+                        if done:
+                            return
         except Exception as e:
-            yield json.dumps({"success": False, "error": str(e)})
+            yield json_dumps({"success": False, "error": str(e)})
             return
+
+    @staticmethod
+    def _stream_message(frame: bytes) -> Tuple[bytes, bool]:
+        """把一帧上游流式数据转换为输出消息字节，返回 (消息字节, 是否为终止错误)"""
+        try:
+            chunk_data = json_loads(frame)
+        except json.JSONDecodeError:
+            # 非JSON格式，直接返回
+            return frame, False
+        if isinstance(chunk_data, dict):
+            # 检查是否为错误响应
+            if "error" in chunk_data:
+                error_info = chunk_data["error"]
+                error_message = error_info.get("message", str(error_info)) if isinstance(error_info, dict) else str(error_info)
+                return json_dumps({"success": False, "error": error_message}), True
+            elif "result" in chunk_data:
+                # 标准JSON-RPC成功响应
+                return json_dumps({"success": True, "result": chunk_data["result"]}), False
+        # 其他格式的响应
+        return frame, False
@@ -1,11 +1,134 @@
 import asyncio
+import builtins
+import functools
 import inspect
+import json
+import sys
+import threading
+import typing
 from dataclasses import dataclass
 from typing import Any, Callable, Dict, List, Optional
+try:
+    import orjson  # 可选，存在时用于加速JSON编解码
+except Exception:
+    orjson = None
+try:
+    import pydantic  # 可选，存在时按函数签名生成参数校验器
+except Exception:
+    pydantic = None
+try:
+    import numba  # 可选，存在时 tool_jit 把数值工具编译为本地代码
+except Exception:
+    numba = None
+
+
+# ===================== JSON 编解码 =====================
+def json_dumps(obj: Any) -> bytes:
+    """序列化为 UTF-8 字节；有 orjson 时走 orjson，否则退回标准库"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False).encode("utf-8")
+
+
+def json_loads(data) -> Any:
+    """反序列化 bytes/str；解析失败抛出 ValueError（JSONDecodeError 的基类）"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def json_line(obj: Any) -> bytes:
+    """流式响应中的一行（NDJSON）"""
+    return json_dumps(obj) + b"\n"
+
+
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def sse_event(obj: Any) -> bytes:
+    """流式响应中的一个 SSE 事件；紧凑 JSON 不含换行，单条 data 行即可"""
+    return b"data: " + json_dumps(obj) + b"\n\n"
+
+
+def wants_sse(headers) -> bool:
+    """客户端 Accept 中声明 text/event-stream 时按 SSE 输出（可直接用浏览器 EventSource 消费）"""
+    return "text/event-stream" in headers.get("accept", "")
+
+
+# ===================== 错误响应 =====================
+# 错误信封的固定部分预先编码，出错时只序列化异常类型名（按类型缓存）与消息
+_ERR_PREFIX = b'{"success":false,"error_type":'
+_ERR_MIDDLE = b',"error":'
+_ERR_TYPE_NAMES: Dict[type, bytes] = {}
+_RPC_ERR_PREFIX = b'{"jsonrpc":"2.0","id":'
+
+
+def error_bytes(e: BaseException) -> bytes:
+    """{"success": false, "error_type": ..., "error": ...} 响应体"""
+    cls = type(e)
+    name = _ERR_TYPE_NAMES.get(cls)
+    if name is None:
+        name = _ERR_TYPE_NAMES[cls] = json_dumps(cls.__name__)
+    return _ERR_PREFIX + name + _ERR_MIDDLE + json_dumps(str(e)) + b"}"
+
+
+def rpc_error_bytes(req_id: Any, code: int, message: str) -> bytes:
+    """JSON-RPC 错误响应体"""
+    return (_RPC_ERR_PREFIX + json_dumps(req_id) + b',"error":{"code":' + str(code).encode()
+            + b',"message":' + json_dumps(message) + b"}}")
+
+
+# ===================== 运行参数 =====================
+def uvicorn_options() -> Dict[str, str]:
+    """uvloop / httptools 为可选依赖（Windows 上没有 uvloop），缺失时退回 uvicorn 默认实现"""
+    opts = {}
+    try:
+        import uvloop  # noqa: F401
+        opts["loop"] = "uvloop"
+    except ImportError:
+        pass
+    try:
+        import httptools  # noqa: F401
+        opts["http"] = "httptools"
+    except ImportError:
+        pass
+    return opts
+
+
+# ===================== 工具类型 =====================
+# 注册时判定一次，请求分发时只做整数比较
+TOOL_SYNC, TOOL_ASYNC, TOOL_ASYNC_GEN = 0, 1, 2
+
+
+def tool_kind(func: Callable) -> int:
+    if inspect.isasyncgenfunction(func):
+        return TOOL_ASYNC_GEN
+    if inspect.iscoroutinefunction(func):
+        return TOOL_ASYNC
+    return TOOL_SYNC
+
+
+# ===================== 同步调用异步工具 =====================
+_bg_loop: Optional[asyncio.AbstractEventLoop] = None
+_bg_loop_lock = threading.Lock()
+
+
+def _background_loop() -> asyncio.AbstractEventLoop:
+    """进程内共享的后台事件循环（守护线程），首次使用时启动
+
+    同步入口调用异步工具时把协程投递到这里执行，避免每次 asyncio.run 新建并销毁事件循环，
+    也不会因调用方所在线程已有运行中的事件循环而报错。
+    """
+    global _bg_loop
+    with _bg_loop_lock:
+        if _bg_loop is None:
+            _bg_loop = asyncio.new_event_loop()
+            threading.Thread(target=_bg_loop.run_forever, name="mcp-tool-loop", daemon=True).start()
+        return _bg_loop
 
 
 # ===================== 工具参数模型 =====================
-@dataclass
+@dataclass(slots=True, frozen=True)  # 无实例 __dict__，注册大量参数时更省内存
 class Parameter:
     name: str
     type: str
@@ -13,6 +136,70 @@ class Parameter:
     required: bool = True
     enum: Optional[List[Any]] = None
 
+# ===================== 参数 schema 提取 =====================
+# Python 注解 -> JSON Schema 类型；未列出的注解一律视为 string
+JSON_TYPE_MAP: Dict[Any, str] = {int: "integer", float: "number", bool: "boolean", list: "array", dict: "object",
+                                 str: "string"}
+
+
+@functools.lru_cache(maxsize=None)
+def _extract_schema_cached(func: Callable) -> Dict:
+    """按函数签名生成参数 schema；同一函数重复注册（插件重载、多名称注册）时直接复用结果
+
+    返回的字典被多个工具共享，调用方不应修改。
+    """
+    sig = inspect.signature(func)
+    # 一次性解析注解：兼容 from __future__ import annotations 下的字符串注解；无法解析时退回原始注解
+    try:
+        hints = typing.get_type_hints(func)
+    except Exception:
+        # 个别注解无法解析时，逐个按名称在函数全局变量与内置类型中查找简单注解（如 "int"）
+        scope = getattr(func, "__globals__", {})
+        hints = {n: scope.get(p.annotation, getattr(builtins, p.annotation, None))
+                 for n, p in sig.parameters.items() if isinstance(p.annotation, str)}
+    properties, required = {}, []
+    for name, param in sig.parameters.items():
+        if name in ("self", "cls"):
+            continue
+        ptype = JSON_TYPE_MAP.get(hints.get(name, param.annotation), "string")
+        properties[name] = {"type": ptype, "description": f"Parameter {name}"}
+        if param.default == inspect.Parameter.empty:
+            required.append(name)
+    schema = {"type": "object", "properties": properties}
+    if required:
+        schema["required"] = required
+    return schema
+
+
+def _build_validator(func: Callable):
+    """按函数签名生成 pydantic 参数校验器（pydantic-core 实现）；未安装 pydantic 或签名不适用时返回 None"""
+    if pydantic is None:
+        return None
+    sig = inspect.signature(func)
+    try:
+        hints = typing.get_type_hints(func)
+    except Exception:
+        hints = {}
+    fields = {}
+    for name, param in sig.parameters.items():
+        if name in ("self", "cls"):
+            continue
+        if param.kind in (inspect.Parameter.VAR_POSITIONAL, inspect.Parameter.VAR_KEYWORD):
+            return None
+        annotation = hints.get(name, param.annotation)
+        if annotation is inspect.Parameter.empty or isinstance(annotation, str):
+            annotation = Any
+        default = ... if param.default is inspect.Parameter.empty else param.default
+        fields[name] = (annotation, default)
+    try:
+        model = pydantic.create_model(f"{func.__name__}_args", __config__=pydantic.ConfigDict(extra="forbid"),
+                                      **fields)
+    except Exception:
+        # 参数名与 BaseModel 属性冲突等情况，退回不校验
+        return None
+    return model.__pydantic_validator__
+
+
 # ===================== MCP 核心 =====================
 class MCPServer:
     def __init__(self, name="MCP Server", protocol_version="2024-11-05"):
@@ -20,15 +207,33 @@ class MCPServer:
         self.protocol_version = protocol_version
         self.tools: Dict[str, Callable] = {}
         self.schemas: Dict[str, Dict] = {}
+        self.kinds: Dict[str, int] = {}  # tool_name -> TOOL_SYNC / TOOL_ASYNC / TOOL_ASYNC_GEN
+        self.validators: Dict[str, Any] = {}  # tool_name -> pydantic SchemaValidator（仅安装 pydantic 时）
+        # tools/list 的缓存（列表与序列化字节），注册新工具时失效
+        self._tools_list: Optional[List[Dict]] = None
+        self._tools_list_bytes: Optional[bytes] = None
+        self._initialize_bytes: Optional[bytes] = None
 
     # 工具装饰器
     def tool(self, name: Optional[str] = None, description: Optional[str] = None,
              parameters: Optional[List[Parameter]] = None):
         def decorator(func: Callable) -> Callable:
-            tool_name = name or func.__name__
-            tool_desc = description or func.__doc__ or "No description"
-            param_schema = self._build_schema(parameters) if parameters else self._extract_schema(func)
+            tool_name = sys.intern(name or func.__name__)  # 与请求中 intern 后的名称比较时走指针相等快路径
+            source = getattr(func, "py_func", func)  # Numba 编译后的函数从原始 Python 函数提取元数据
+            # 显式挂上签名：叠加装饰器（如 Numba 包装）后 inspect.signature 仍可用，且后续直接读属性
+            try:
+                func.__signature__ = inspect.signature(source)
+            except (TypeError, ValueError, AttributeError):
+                pass
+            tool_desc = description or source.__doc__ or "No description"
+            param_schema = self._build_schema(parameters) if parameters else self._extract_schema(source)
             self.tools[tool_name] = func
+            self.kinds[tool_name] = tool_kind(func)
+            validator = _build_validator(source)
+            if validator is not None:
+                self.validators[tool_name] = validator
+            else:
+                self.validators.pop(tool_name, None)
             self.schemas[tool_name] = {
                 "type": "function",
                 "function": {
@@ -37,42 +242,64 @@ class MCPServer:
                     "parameters": param_schema
                 }
             }
+            self._tools_list = None
+            self._tools_list_bytes = None
+            self._initialize_bytes = None
             return func
         return decorator
 
+    def tool_jit(self, signature=None, **tool_kwargs):
+        """注册数值计算工具，安装了 Numba 时以 nopython 模式编译（cache=True 复用磁盘缓存）
+
+        给出 signature 时在注册阶段立即编译，首次调用无需等待 JIT；未安装 Numba 时按普通工具注册。
+        参数经 JSON 传入，签名只应包含标量类型；schema 仍按函数的类型注解生成。
+        """
+        def decorator(func: Callable) -> Callable:
+            if numba is None:
+                return self.tool(**tool_kwargs)(func)
+            if signature is not None:
+                jitted = numba.njit(signature, cache=True)(func)
+            else:
+                jitted = numba.njit(cache=True)(func)
+            self.tool(**tool_kwargs)(jitted)
+            return jitted
+        return decorator
+
     def _build_schema(self, params: List[Parameter]) -> Dict:
         properties, required = {}, []
+        append_required = required.append
         for p in params:
-            properties[p.name] = {"type": p.type, "description": p.description}
+            prop = {"type": p.type, "description": p.description}
             if p.enum:
-                properties[p.name]["enum"] = p.enum
+                prop["enum"] = p.enum
+            properties[p.name] = prop
             if p.required:
-                required.append(p.name)
+                append_required(p.name)
         schema = {"type": "object", "properties": properties}
         if required:
             schema["required"] = required
         return schema
 
     def _extract_schema(self, func: Callable) -> Dict:
-        sig = inspect.signature(func)
-        properties, required = {}, []
-        for name, param in sig.parameters.items():
-            if name in ("self", "cls"):
-                continue
-            ptype = "string"
-            if param.annotation != inspect.Parameter.empty:
-                ptype = {int: "integer", float: "number", bool: "boolean", list: "array", dict: "object"}.get(
-                    param.annotation, "string")
-            properties[name] = {"type": ptype, "description": f"Parameter {name}"}
-            if param.default == inspect.Parameter.empty:
-                required.append(name)
-        schema = {"type": "object", "properties": properties}
-        if required:
-            schema["required"] = required
-        return schema
+        return _extract_schema_cached(func)
+
+    def validate_arguments(self, tool_name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        """校验并转换调用参数；校验失败抛出 pydantic.ValidationError（ValueError 子类），无校验器时原样返回"""
+        validator = self.validators.get(tool_name)
+        if validator is None:
+            return arguments
+        return dict(validator.validate_python(arguments))
 
     def list_tools(self) -> List[Dict]:
-        return list(self.schemas.values())
+        if self._tools_list is None:
+            self._tools_list = list(self.schemas.values())
+        return self._tools_list
+
+    def tools_list_bytes(self) -> bytes:
+        """预序列化的 tools/list 响应体，工具注册完成后每次请求直接复用"""
+        if self._tools_list_bytes is None:
+            self._tools_list_bytes = json_dumps(self.list_tools())
+        return self._tools_list_bytes
 
     def call_tool(self, tool_name: str, arguments: Dict[str, Any]) -> Dict:
         func = self.tools.get(tool_name)
@@ -80,9 +307,11 @@ class MCPServer:
             return {"success": False, "error": f"Tool '{tool_name}' not found"}
 
         try:
-            if inspect.iscoroutinefunction(func):
-                # 异步函数直接 await
-                return {"success": True, "result": asyncio.run(func(**arguments))}
+            arguments = self.validate_arguments(tool_name, arguments)
+            if self.kinds[tool_name] == TOOL_ASYNC:
+                # 异步函数投递到后台事件循环执行并等待结果
+                future = asyncio.run_coroutine_threadsafe(func(**arguments), _background_loop())
+                return {"success": True, "result": future.result()}
             else:
                 return {"success": True, "result": func(**arguments)}
         except Exception as e:
@@ -95,6 +324,12 @@ class MCPServer:
             "tools": self.list_tools()
         }
 
+    def initialize_bytes(self) -> bytes:
+        """预序列化的 initialize 响应体；响应与客户端参数无关，工具不变时每次握手直接复用"""
+        if self._initialize_bytes is None:
+            self._initialize_bytes = json_dumps(self.initialize({}, {}))
+        return self._initialize_bytes
+
     def tools_call(self, name: str, arguments: Dict[str, Any]):
         return self.call_tool(name, arguments)
 
@@ -1,16 +1,24 @@
 import asyncio
-import inspect
-import json
+import functools
+import os
 import re
-from typing import AsyncGenerator, Optional
+import sys
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import AsyncGenerator, Callable, Optional, Tuple
 
 import httpx
+try:
+    import h2  # 可选，存在时共享客户端启用 HTTP/2
+except Exception:
+    h2 = None
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
-from tavily import TavilyClient
+from fastapi.responses import JSONResponse, ORJSONResponse, Response, StreamingResponse
 
-from mcp_server import MCPServer, Parameter
+from mcp_server import (MCPServer, Parameter, SSE_HEADERS, TOOL_ASYNC, TOOL_ASYNC_GEN, error_bytes, json_dumps,
+                        json_line, json_loads, orjson, rpc_error_bytes, sse_event, uvicorn_options, wants_sse)
 
 
 # ===================== 配置管理 =====================
@@ -18,12 +26,21 @@ class Settings:
     """简单的配置类，可以改成从文件/数据库加载"""
 
     def __init__(self):
-        self.tavily_api_key = "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"
-        self.jina_api_key = ""  # 可选，不填就不带 Authorization
+        # API key 从环境变量读取，不写进代码
+        self.tavily_api_key = os.getenv("TAVILY_API_KEY", "")
+        self.jina_api_key = os.getenv("JINA_API_KEY", "")  # 可选，不填就不带 Authorization
         self.tavily_max_results = 5
         self.jina_max_length = 1500
         self.content_per_page = 1000
 
+        if not self.tavily_api_key:
+            print("警告: 未设置 TAVILY_API_KEY，Tavily 搜索将返回空结果")
+
+        # 请求头和请求体模板只构建一次，每次请求直接复用
+        self.tavily_headers = {"Authorization": f"Bearer {self.tavily_api_key}", "Content-Type": "application/json"}
+        self.tavily_body = {"include_answer": True, "include_raw_content": False}
+        self.jina_headers = {"Authorization": f"Bearer {self.jina_api_key}"} if self.jina_api_key else {}
+
 
 settings = Settings()
 
@@ -31,37 +48,138 @@ settings = Settings()
 mcp = MCPServer(name="Web Search MCP Server")
 
 
+# ===================== 共享 HTTP 客户端 =====================
+TAVILY_SEARCH_URL = "https://api.tavily.com/search"
+HTTP_LIMITS = httpx.Limits(max_connections=50, max_keepalive_connections=20)
+# 同时进行的 Jina 抓取上限：并发搜索较多时在这里排队，而不是堆积在连接池里等到超时
+JINA_CONCURRENCY = 10
+_jina_sem = asyncio.Semaphore(JINA_CONCURRENCY)
+# Jina 原文最多读取 max_length 的多少倍（提取正文时会丢弃导航等行，需留余量）
+JINA_READ_FACTOR = 8
+_http_client: Optional[httpx.AsyncClient] = None
+
+
+def http_client() -> httpx.AsyncClient:
+    """进程内共享的 httpx 客户端，首次使用时创建；复用连接池，重复访问同一站点省去 TCP/TLS 握手"""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(timeout=20, http2=h2 is not None, limits=HTTP_LIMITS)
+    return _http_client
+
+
+async def close_http_client():
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
 # ===================== 辅助函数 =====================
+_WS_RE = re.compile(r'\s+')
+_CTRL_RE = re.compile(r'[\x00-\x1f\x7f-\x9f]')
+# extract_main_content 中整行丢弃的导航/页脚类关键词（在小写文本上匹配）
+_SKIP_KEYWORDS_RE = re.compile(r'navigation|menu|footer|subscribe|cookie|privacy policy')
+# 本机/内网地址：只在主机名开头处匹配（行首、// 或 userinfo 的 @ 之后），避免 110.x、/v10.2 之类误判
+_INTERNAL_RE = re.compile(
+    r'(?:^|//|@)(?:localhost|127\.0\.0\.1|192\.168\.|10\.|172\.(?:1[6-9]|2\d|3[01])\.)', re.I)
+
+
+def _is_internal(url: str) -> bool:
+    return _INTERNAL_RE.search(url) is not None
+
 
 def clean_text(text: str, max_length: int = 2000) -> str:
     """清理和截断文本"""
     if not text:
         return ""
-    text = re.sub(r'\s+', ' ', text)
-    text = re.sub(r'[\x00-\x1f\x7f-\x9f]', '', text)
+    text = _WS_RE.sub(' ', text)
+    text = _CTRL_RE.sub('', text)
     if len(text) > max_length:
         text = text[:max_length] + "..."
     return text.strip()
 
 
+# clean_texts 用 \x01 拼接多段文本，清理控制字符时保留分隔符
+_BATCH_SEP = '\x01'
+_CTRL_KEEP_SEP_RE = re.compile(r'[\x00\x02-\x1f\x7f-\x9f]')
+
+
+def clean_texts(pairs) -> list:
+    """批量清理 (text, max_length) 列表：拼成一段只跑一遍正则，再拆回各段截断，结果与逐个 clean_text 相同"""
+    texts = [text or "" for text, _ in pairs]
+    blob = _BATCH_SEP.join(texts)
+    if blob.count(_BATCH_SEP) != len(texts) - 1:
+        # 原文自带 \x01 时无法按分隔符拆回，退回逐个清理
+        return [clean_text(text, max_length) for text, max_length in pairs]
+
+    parts = _CTRL_KEEP_SEP_RE.sub('', _WS_RE.sub(' ', blob)).split(_BATCH_SEP)
+    cleaned = []
+    for text, (_, max_length) in zip(parts, pairs):
+        if len(text) > max_length:
+            text = text[:max_length] + "..."
+        cleaned.append(text.strip())
+    return cleaned
+
+
+def _drop_lines(text: str, lowered: str) -> str:
+    """删除含跳过关键词的整行；lowered 为 text 的小写形式且与其等长，查找在 lowered 上进行"""
+    parts, pos = [], 0
+    m = _SKIP_KEYWORDS_RE.search(lowered)
+    while m:
+        start = lowered.rfind("\n", 0, m.start()) + 1
+        end = lowered.find("\n", m.end())
+        parts.append(text[pos:start])
+        if end < 0:
+            pos = len(text)
+            break
+        pos = end
+        m = _SKIP_KEYWORDS_RE.search(lowered, pos)
+    parts.append(text[pos:])
+    return "".join(parts)
+
+
 def extract_main_content(html_text: str, max_length: int = 1500) -> str:
     """从 Jina 返回的文本中提取主要内容"""
     if not html_text:
         return ""
 
-    lines = html_text.split('\n')
-    content_lines = []
-    skip_keywords = ['navigation', 'menu', 'footer', 'subscribe', 'cookie', 'privacy policy']
+    # 整段只转一次小写、用一个正则定位关键词，只切掉命中的行；其余行的空白由 clean_text 统一压缩
+    lowered = html_text.lower()
+    if len(lowered) == len(html_text):
+        content = _drop_lines(html_text, lowered).strip()
+    else:
+        # 个别字符（如 İ）小写后长度变化、下标无法对齐时逐行判断
+        content = ' '.join(line for line in html_text.split('\n')
+                           if not _SKIP_KEYWORDS_RE.search(line.lower())).strip()
+    return clean_text(content, max_length)
+
 
-    for line in lines:
-        line_lower = line.lower()
-        if any(keyword in line_lower for keyword in skip_keywords):
-            continue
-        if line.strip():
-            content_lines.append(line.strip())
+def async_ttl_cache(maxsize: int, ttl: float, key: Optional[Callable] = None, cache_if: Optional[Callable] = None):
+    """异步函数结果的 LRU + TTL 缓存
 
-    content = ' '.join(content_lines)
-    return clean_text(content, max_length)
+    key 把调用参数规范化为缓存键（提高命中率），cache_if 判断结果是否可缓存（失败结果不缓存）。
+    """
+    def decorator(func):
+        cache: OrderedDict = OrderedDict()
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            k = key(*args, **kwargs) if key else (args, tuple(sorted(kwargs.items())))
+            hit = cache.get(k)
+            if hit is not None and hit[0] > time.monotonic():
+                cache.move_to_end(k)
+                return hit[1]
+            value = await func(*args, **kwargs)
+            if cache_if is None or cache_if(value):
+                cache[k] = (time.monotonic() + ttl, value)
+                cache.move_to_end(k)
+                if len(cache) > maxsize:
+                    cache.popitem(last=False)
+            return value
+
+        wrapper.cache_clear = cache.clear
+        return wrapper
+    return decorator
 
 
 def format_sources(results: list) -> str:
@@ -78,12 +196,17 @@ def format_sources(results: list) -> str:
 
 # ===================== 核心工具函数 =====================
 
+@async_ttl_cache(
+    maxsize=2048, ttl=3600,  # 网页内容变化较慢
+    key=lambda original_url, max_length=None: (original_url.strip(), max_length or settings.jina_max_length),
+    cache_if=lambda fetched: fetched[0]
+)
 async def jina_crawler_internal(
         original_url: str,
         max_length: Optional[int] = None
-) -> str:
+) -> Tuple[bool, str]:
     """
-    内部 Jina 爬虫函数，返回网页内容文本
+    内部 Jina 爬虫函数，返回 (是否成功, 网页内容文本或错误信息)
     """
     if max_length is None:
         max_length = settings.jina_max_length
@@ -92,23 +215,30 @@ async def jina_crawler_internal(
     url = f"{detail_url}{original_url}"
 
     try:
-        headers = {}
-        if settings.jina_api_key:
-            headers['Authorization'] = f'Bearer {settings.jina_api_key}'
-
-        async with httpx.AsyncClient(timeout=20) as client:
-            response = await client.get(url, headers=headers)
-
-            if response.status_code == 200:
-                content = extract_main_content(response.text, max_length)
-                return content
-            else:
-                return f"获取{original_url}网页信息失败，状态码：{response.status_code}"
+        # 流式读取，原文够用（max_length 的 JINA_READ_FACTOR 倍）即停止下载，大页面不必整页读入内存
+        limit = max_length * JINA_READ_FACTOR
+        parts, total = [], 0
+        async with _jina_sem:
+            async with http_client().stream("GET", url, headers=settings.jina_headers) as response:
+                if response.status_code != 200:
+                    return False, f"获取{original_url}网页信息失败，状态码：{response.status_code}"
+                async for chunk in response.aiter_text():
+                    parts.append(chunk)
+                    total += len(chunk)
+                    if total >= limit:
+                        break
+
+        return True, extract_main_content("".join(parts), max_length)
 
     except Exception as e:
-        return f"获取{original_url}网页信息失败，错误信息：{str(e)}"
+        return False, f"获取{original_url}网页信息失败，错误信息：{str(e)}"
 
 
+@async_ttl_cache(
+    maxsize=512, ttl=600,
+    key=lambda query, max_results=None: (" ".join(query.split()).lower(), max_results or settings.tavily_max_results),
+    cache_if=lambda result: bool(result.get("results"))
+)
 async def tavily_search_internal(
         query: str,
         max_results: Optional[int] = None
@@ -120,18 +250,11 @@ async def tavily_search_internal(
         max_results = settings.tavily_max_results
 
     try:
-        def sync_search():
-            client = TavilyClient(api_key=settings.tavily_api_key)
-            return client.search(
-                query=query,
-                max_results=max_results,
-                include_answer=True,
-                include_raw_content=False
-            )
-
-        loop = asyncio.get_event_loop()
-        response = await loop.run_in_executor(None, sync_search)
-        return response
+        # 直接调用 Tavily REST 接口，复用共享连接池，不再为每次搜索新建同步客户端并占用线程池
+        body = {**settings.tavily_body, "query": query, "max_results": max_results}
+        response = await http_client().post(TAVILY_SEARCH_URL, content=json_dumps(body), headers=settings.tavily_headers)
+        response.raise_for_status()
+        return json_loads(response.content)
 
     except Exception as e:
         print(f"Tavily search error: {e}")
@@ -188,12 +311,9 @@ async def tavily_search(
     results = search_result.get("results", [])
     answer = search_result.get("answer", "")
 
-    res = clean_text(answer, 500)
-    res += "\n 信息来源："
-    for r in results:
-        res += f" [{r.get('snippet', '')}]({r.get('url', '')})"
-
-    return res
+    parts = [clean_text(answer, 500), "\n 信息来源："]
+    parts.extend(f" [{r.get('snippet', '')}]({r.get('url', '')})" for r in results)
+    return "".join(parts)
 
 
 @mcp.tool(
@@ -212,7 +332,7 @@ async def jina_crawler(
     Jina 爬虫工具：抓取单个网页内容
     """
     # 检查是否是本地/内网地址
-    if any(pattern in original_url.lower() for pattern in ['localhost', '127.0.0.1', '192.168.', '10.', '172.16.']):
+    if _is_internal(original_url):
         return {
             "url": original_url,
             "success": False,
@@ -220,10 +340,9 @@ async def jina_crawler(
             "content": None
         }
 
-    content = await jina_crawler_internal(original_url, max_length)
+    ok, content = await jina_crawler_internal(original_url, max_length)
 
-    # 判断是否成功
-    if content.startswith("获取") and "失败" in content:
+    if not ok:
         return {
             "url": original_url,
             "success": False,
@@ -265,28 +384,38 @@ async def deep_search(
     results = search_result.get("results", [])
     answer = search_result.get("answer", "")
 
-    # 第二步：Jina 爬取网页内容
-    enriched_results = []
+    # 第二步：Jina 并发爬取网页内容，总耗时取决于最慢的页面而不是各页耗时之和
+    targets = []
     for result in results[:max_results]:
         url = result.get("url")
         if not url:
             continue
 
         # 跳过本地/内网地址
-        if any(pattern in url.lower() for pattern in ['localhost', '127.0.0.1', '192.168.', '10.', '172.16.']):
+        if _is_internal(url):
             continue
 
-        content = await jina_crawler_internal(url, content_per_page)
+        targets.append((result, url))
+
+    fetched = await asyncio.gather(*(jina_crawler_internal(url, content_per_page) for _, url in targets))
 
+    # answer 与各结果的 title/snippet 一次批量清理
+    cleaned = clean_texts([(answer, 500)] + [
+        pair for result, _ in targets
+        for pair in ((result.get("title", ""), 100), (result.get("content", ""), 200))
+    ])
+
+    enriched_results = []
+    for i, ((result, url), (ok, content)) in enumerate(zip(targets, fetched)):
         item = {
-            "title": clean_text(result.get("title", ""), 100),
+            "title": cleaned[2 * i + 1],
             "url": url,
-            "snippet": clean_text(result.get("content", ""), 200),
+            "snippet": cleaned[2 * i + 2],
             "score": round(result.get("score", 0), 2)
         }
 
         # 判断是否成功爬取
-        if content.startswith("获取") and "失败" in content:
+        if not ok:
             item["full_content"] = None
             item["fetch_error"] = content
         else:
@@ -300,7 +429,7 @@ async def deep_search(
 
     return {
         "query": query,
-        "answer": clean_text(answer, 500),
+        "answer": cleaned[0],
         "results": enriched_results,
         "sources_markdown": sources_text,
         "result_count": len(enriched_results)
@@ -329,8 +458,6 @@ async def tavily_search_stream(
         "progress": 0
     }
 
-    await asyncio.sleep(0.1)
-
     try:
         search_result = await tavily_search_internal(query, max_results)
         results = search_result.get("results", [])
@@ -342,23 +469,25 @@ async def tavily_search_stream(
             "progress": 50
         }
 
-        await asyncio.sleep(0.1)
-
         sources_text = format_sources(results)
+        cleaned = clean_texts([(answer, 500)] + [
+            pair for r in results
+            for pair in ((r.get("title", ""), 100), (r.get("content", ""), 200))
+        ])
 
         yield {
             "type": "result",
             "data": {
                 "query": query,
-                "answer": clean_text(answer, 500),
+                "answer": cleaned[0],
                 "sources": [
                     {
-                        "title": clean_text(r.get("title", ""), 100),
+                        "title": cleaned[2 * i + 1],
                         "url": r.get("url", ""),
-                        "snippet": clean_text(r.get("content", ""), 200),
+                        "snippet": cleaned[2 * i + 2],
                         "score": round(r.get("score", 0), 2)
                     }
-                    for r in results
+                    for i, r in enumerate(results)
                 ],
                 "sources_markdown": sources_text,
                 "result_count": len(results)
@@ -400,8 +529,6 @@ async def deep_search_stream(
         "progress": 0
     }
 
-    await asyncio.sleep(0.1)
-
     try:
         # 搜索
         search_result = await tavily_search_internal(query, max_results)
@@ -415,52 +542,58 @@ async def deep_search_stream(
             "progress": 30
         }
 
-        await asyncio.sleep(0.1)
-
-        # 逐个爬取
-        enriched_results = []
-        valid_results = [r for r in results[:max_results] if r.get("url")]
-
-        for i, result in enumerate(valid_results):
-            url = result.get("url")
-
-            # 跳过本地地址
-            if any(pattern in url.lower() for pattern in ['localhost', '127.0.0.1', '192.168.']):
-                continue
+        # 并发爬取（跳过本地地址），每个网页完成时立即返回部分结果
+        valid_results = [r for r in results[:max_results] if r.get("url") and not _is_internal(r["url"])]
+        enriched_results = [None] * len(valid_results)
+        # answer 与各结果的 title/snippet 在爬取开始前一次批量清理
+        cleaned = clean_texts([(answer, 500)] + [
+            pair for r in valid_results
+            for pair in ((r.get("title", ""), 100), (r.get("content", ""), 200))
+        ])
 
+        if valid_results:
             yield {
                 "type": "status",
-                "message": f"正在爬取第 {i + 1}/{len(valid_results)} 个网页: {result.get('title', '')[:30]}...",
+                "message": f"正在并发爬取 {len(valid_results)} 个网页...",
                 "stage": "fetching",
-                "progress": 30 + (i + 1) * (60 // len(valid_results))
-            }
-
-            content = await jina_crawler_internal(url, content_per_page)
-
-            item = {
-                "title": clean_text(result.get("title", ""), 100),
-                "url": url,
-                "snippet": clean_text(result.get("content", ""), 200),
-                "score": round(result.get("score", 0), 2)
-            }
-
-            if content.startswith("获取") and "失败" in content:
-                item["full_content"] = None
-                item["fetch_error"] = content
-            else:
-                item["full_content"] = content
-                item["content_length"] = len(content)
-
-            enriched_results.append(item)
-
-            yield {
-                "type": "partial_result",
-                "message": f"已完成第 {i + 1} 个网页",
-                "data": item,
-                "progress": 30 + (i + 1) * (60 // len(valid_results))
+                "progress": 30
             }
 
-            await asyncio.sleep(0.1)
+        async def fetch(index: int, result: dict):
+            return (index, result, *await jina_crawler_internal(result["url"], content_per_page))
+
+        tasks = [asyncio.ensure_future(fetch(i, r)) for i, r in enumerate(valid_results)]
+        try:
+            for done, next_done in enumerate(asyncio.as_completed(tasks), 1):
+                i, result, ok, content = await next_done
+                url = result["url"]
+
+                item = {
+                    "title": cleaned[2 * i + 1],
+                    "url": url,
+                    "snippet": cleaned[2 * i + 2],
+                    "score": round(result.get("score", 0), 2)
+                }
+
+                if not ok:
+                    item["full_content"] = None
+                    item["fetch_error"] = content
+                else:
+                    item["full_content"] = content
+                    item["content_length"] = len(content)
+
+                enriched_results[i] = item  # 最终结果保持搜索结果的顺序
+
+                yield {
+                    "type": "partial_result",
+                    "message": f"已完成 {done}/{len(valid_results)} 个网页",
+                    "data": item,
+                    "progress": 30 + done * (60 // len(valid_results))
+                }
+        finally:
+            # 客户端提前断开时取消尚未完成的爬取
+            for task in tasks:
+                task.cancel()
 
         # 最终结果
         sources_text = format_sources(results)
@@ -469,7 +602,7 @@ async def deep_search_stream(
             "type": "result",
             "data": {
                 "query": query,
-                "answer": clean_text(answer, 500),
+                "answer": cleaned[0],
                 "results": enriched_results,
                 "sources_markdown": sources_text,
                 "result_count": len(enriched_results)
@@ -486,7 +619,16 @@ async def deep_search_stream(
 
 
 # ===================== FastAPI 应用 =====================
-app = FastAPI(title=mcp.name, version="1.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
+    yield
+    # 关闭时释放共享 HTTP 客户端的连接
+    await close_http_client()
+
+
+# 有 orjson 时所有非流式响应都用 orjson 序列化
+app = FastAPI(title=mcp.name, version="1.0.0", lifespan=lifespan,
+              default_response_class=ORJSONResponse if orjson is not None else JSONResponse)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -497,46 +639,57 @@ app.add_middleware(
 
 @app.post("/mcp")
 async def streamable_http_mcp(req: Request):
-    payload = await req.json()
+    try:
+        payload = json_loads(await req.body())
+    except ValueError as e:
+        return Response(content=error_bytes(e), media_type="application/json")
+    if not isinstance(payload, dict):
+        # 不支持 JSON-RPC batch（列表）等非对象请求
+        return Response(content=rpc_error_bytes(None, -32600, "Invalid Request: expected a JSON object"),
+                        media_type="application/json")
     method = payload.get("method")
     params = payload.get("params", {})
 
     try:
         if method == "initialize":
-            result = mcp.initialize(
-                client_info=params.get("clientInfo", {}),
-                capabilities=params.get("capabilities", {})
-            )
-            return result
+            return Response(content=mcp.initialize_bytes(), media_type="application/json")
 
         elif method == "tools/call":
-            tool_name = params["name"]
+            tool_name = sys.intern(params["name"])
             arguments = params.get("arguments", {})
             func = mcp.tools.get(tool_name)
             if func is None:
                 raise ValueError(f"Tool '{tool_name}' not found")
+            kind = mcp.kinds[tool_name]
+            arguments = mcp.validate_arguments(tool_name, arguments)
+
+            sse = wants_sse(req.headers)
+            frame = sse_event if sse else json_line
 
             async def stream_tool():
-                if inspect.isasyncgenfunction(func):
+                if kind == TOOL_ASYNC_GEN:
                     async for chunk in func(**arguments):
-                        yield json.dumps(chunk, ensure_ascii=False) + "\n"
-                elif inspect.iscoroutinefunction(func):
+                        yield frame(chunk)
+                elif kind == TOOL_ASYNC:
                     result = await func(**arguments)
-                    yield json.dumps({"type": "result", "data": result}, ensure_ascii=False) + "\n"
+                    yield frame({"type": "result", "data": result})
                 else:
-                    result = func(**arguments)
-                    yield json.dumps({"type": "result", "data": result}, ensure_ascii=False) + "\n"
+                    # 同步工具放到线程池执行，避免慢工具阻塞事件循环
+                    result = await asyncio.to_thread(func, **arguments)
+                    yield frame({"type": "result", "data": result})
 
-            return StreamingResponse(stream_tool(), media_type="application/json")
+            if sse:
+                return StreamingResponse(stream_tool(), media_type="text/event-stream", headers=SSE_HEADERS)
+            return StreamingResponse(stream_tool(), media_type="application/x-ndjson")
 
         elif method in ("tools/list", "tools/roots"):
-            return mcp.tools_list()
+            return Response(content=mcp.tools_list_bytes(), media_type="application/json")
 
         else:
             raise ValueError(f"Method '{method}' not found")
 
     except Exception as e:
-        return {"error": str(e), "error_type": type(e).__name__}
+        return Response(content=error_bytes(e), media_type="application/json")
 
 
 @app.get("/health")
@@ -568,4 +721,4 @@ if __name__ == "__main__":
     for tool_name in mcp.tools.keys():
         print(f"   - {tool_name}")
     print(f"⚙️  配置: Tavily最大结果={settings.tavily_max_results}, Jina最大长度={settings.jina_max_length}")
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    uvicorn.run(app, host="0.0.0.0", port=8000, **uvicorn_options())
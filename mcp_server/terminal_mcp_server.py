@@ -1,12 +1,15 @@
-import json
 import asyncio
-import inspect
+import hashlib
+import json
 import subprocess
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import JSONResponse, ORJSONResponse, Response, StreamingResponse
 from typing import AsyncGenerator, Dict, Any, Optional
 
+from mcp_server import (SSE_HEADERS, TOOL_ASYNC, TOOL_ASYNC_GEN, json_dumps, json_loads, orjson, rpc_error_bytes,
+                        tool_kind, uvicorn_options, wants_sse)
+
 # 命令安全等级
 SAFETY_LEVELS = {
     "SAFE": 0,      # 安全命令
@@ -15,6 +18,9 @@ SAFETY_LEVELS = {
 }
 
 # 危险命令模式
+# 避免 \s+.*X 这类相邻量词可互相让渡字符的写法（长输入下回溯为平方级）：
+# 末尾的 .* 不影响 search 结果直接去掉；literal 之前的 \s+.* 改写为等价的无歧义形式：
+# 先跳过若干以换行结尾的空白行，再用排除换行与该 literal 的字符类走到 literal（. 不匹配换行，与原模式一致）
 dangerous_commands = [
     r'rm\s+-rf',
     r'sudo\s+',
@@ -31,32 +37,142 @@ dangerous_commands = [
     r'mount\s+',
     r'umount\s+',
     r'iptables\s+',
-    r'curl\s+.*>.*',
-    r'wget\s+.*>.*',
-    r'echo\s+.*>.*',
-    r'cat\s+.*>.*',
-    r'touch\s+/etc/.*',
-    r'rmdir\s+/.*',
-    r'mv\s+/.*',
-    r'cp\s+/.*',
-    r'git\s+/.*',
+    r'curl\s(?:[^\S\n]*\n)*[^>\n]*>',
+    r'wget\s(?:[^\S\n]*\n)*[^>\n]*>',
+    r'echo\s(?:[^\S\n]*\n)*[^>\n]*>',
+    r'cat\s(?:[^\S\n]*\n)*[^>\n]*>',
+    r'touch\s+/etc/',
+    r'rmdir\s+/',
+    r'mv\s+/',
+    r'cp\s+/',
+    r'git\s+/',
 ]
 
 # 警告命令模式
 warning_commands = [
     r'rm\s+',
-    r'mkdir\s+-p\s+/.*',
-    r'cd\s+/.*',
-    r'ls\s+-la\s+/.*',
-    r'find\s+/.*',
-    r'grep\s+.*>/.*',
-    r'sort\s+.*>/.*',
-    r'uniq\s+.*>/.*',
+    r'mkdir\s+-p\s+/',
+    r'cd\s+/',
+    r'ls\s+-la\s+/',
+    r'find\s+/',
+    r'grep\s(?:[^\S\n]*\n)*(?:[^>\n]|>(?!/))*>/',
+    r'sort\s(?:[^\S\n]*\n)*(?:[^>\n]|>(?!/))*>/',
+    r'uniq\s(?:[^\S\n]*\n)*(?:[^>\n]|>(?!/))*>/',
 ]
 
 import re
 import time
+import atexit
 import os
+import shlex
+import sys
+import codecs
+import mmap
+import shutil
+import threading
+from collections import deque
+from functools import lru_cache
+try:
+    import ahocorasick_rs  # 可选，模式很多时用 Aho-Corasick 自动机一次扫描完成字面预筛选
+except Exception:
+    ahocorasick_rs = None
+
+# 出现这些字符时需要 shell 解释（管道、重定向、变量、通配符、引号转义、多命令等）
+SHELL_METACHARS = frozenset("|&;<>()$`\\*?[]{}~!#=\n")
+
+
+# 流式执行时每次从子进程读取的最大字节数
+STREAM_READ_SIZE = 64 * 1024
+
+
+@lru_cache(maxsize=256)
+def _which(program: str, path: Optional[str]) -> Optional[str]:
+    """按 PATH 查找程序；缓存以 (程序名, PATH) 为键，PATH 变化后自然失效"""
+    return shutil.which(program, path=path)
+
+
+def split_simple_command(command: str) -> Optional[list]:
+    """简单命令（无 shell 语法、程序可在 PATH 中找到）拆分为 argv，可直接 exec 省去一个 /bin/sh 进程
+
+    无法安全拆分时返回 None，由调用方交给 shell 执行。shell 内建命令（cd、export 等）不在 PATH 中，也会走 shell。
+    带路径的程序（./tool、/usr/bin/ls）相对命令的工作目录解析，同样交给 shell。
+    """
+    if os.name != "posix" or not SHELL_METACHARS.isdisjoint(command):
+        return None
+    try:
+        argv = shlex.split(command)
+    except ValueError:
+        return None
+    if not argv or "/" in argv[0] or _which(argv[0], os.environ.get("PATH")) is None:
+        return None
+    return argv
+
+# 命令历史：JSONL 追加写，每条记录一行，写入代价与已有历史的大小无关
+# 记录先进入内存队列，由后台线程攒满 HISTORY_BUFFER_SIZE 条或每 HISTORY_MAX_TIME 秒批量写入一次
+HISTORY_FILE = "command_history.jsonl"
+HISTORY_BUFFER_SIZE = 64
+HISTORY_MAX_TIME = 1.0
+# 当前历史文件达到该大小后改名归档为 command_history.<毫秒时间戳>.jsonl，另起新文件
+MAX_HISTORY_BYTES = 10 * 1024 * 1024
+_history_fh = None
+_history_lock = threading.Lock()
+_history_queue = deque()
+_history_wakeup = threading.Event()
+_history_writer = None
+
+
+def _history_file():
+    """懒打开历史文件（追加模式），调用方需持有 _history_lock"""
+    global _history_fh
+    if _history_fh is None:
+        _history_fh = open(HISTORY_FILE, "ab", buffering=65536)
+    return _history_fh
+
+
+def _rotate_history_file(fh):
+    """历史文件超过 MAX_HISTORY_BYTES 时归档并返回新文件句柄，调用方需持有 _history_lock"""
+    global _history_fh
+    if os.fstat(fh.fileno()).st_size < MAX_HISTORY_BYTES:
+        return fh
+    fh.close()
+    _history_fh = None
+    stem, ext = os.path.splitext(HISTORY_FILE)
+    os.replace(HISTORY_FILE, f"{stem}.{int(time.time() * 1000)}{ext}")  # 毫秒时间戳，避免同一秒内归档重名
+    return _history_file()
+
+
+def flush_command_history():
+    """把队列中的记录一次性写入文件"""
+    with _history_lock:
+        if not _history_queue:
+            return
+        lines = []
+        while _history_queue:
+            lines.append(json_dumps(_history_queue.popleft()))
+        try:
+            fh = _rotate_history_file(_history_file())
+            fh.write(b"\n".join(lines) + b"\n")
+            fh.flush()
+        except Exception:
+            # 忽略文件写入错误，不影响命令执行
+            pass
+
+
+def _history_writer_loop():
+    while True:
+        _history_wakeup.wait(HISTORY_MAX_TIME)
+        _history_wakeup.clear()
+        flush_command_history()
+
+
+def _start_history_writer():
+    global _history_writer
+    with _history_lock:
+        if _history_writer is None:
+            _history_writer = threading.Thread(target=_history_writer_loop, name="command-history", daemon=True)
+            _history_writer.start()
+            atexit.register(flush_command_history)  # 退出前写出尚未落盘的记录
+
 
 def record_command_history(command: str, success: bool, returncode: int, stdout: str, stderr: str, safety_assessment: Dict[str, Any], working_directory: str):
     """记录命令执行历史到文件
@@ -70,18 +186,6 @@ def record_command_history(command: str, success: bool, returncode: int, stdout:
         safety_assessment: 命令安全评估结果
         working_directory: 命令执行的工作目录
     """
-    history_file = "command_history.json"
-    
-    # 读取现有历史记录
-    history = []
-    if os.path.exists(history_file):
-        try:
-            with open(history_file, 'r', encoding='utf-8') as f:
-                history = json.load(f)
-        except Exception:
-            # 如果文件损坏，创建新的历史记录
-            history = []
-    
     # 创建新的命令记录
     command_record = {
         "timestamp": time.time(),
@@ -95,16 +199,119 @@ def record_command_history(command: str, success: bool, returncode: int, stdout:
         "executed_at": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
     }
     
-    # 追加新记录
-    history.append(command_record)
-    
-    # 写入历史记录文件
+    # 入队，由后台线程批量写入
+    if _history_writer is None:
+        _start_history_writer()
+    _history_queue.append(command_record)
+    if len(_history_queue) >= HISTORY_BUFFER_SIZE:
+        _history_wakeup.set()
+
+def _history_archives() -> list:
+    """已归档的历史文件（command_history.<毫秒时间戳>.jsonl），按归档时间从新到旧"""
+    stem, ext = os.path.splitext(HISTORY_FILE)
+    directory, prefix = os.path.split(stem + ".")
+    try:
+        entries = os.listdir(directory or ".")
+    except OSError:
+        return []
+    archives = []
+    for entry in entries:
+        if entry.startswith(prefix) and entry.endswith(ext):
+            stamp = entry[len(prefix):len(entry) - len(ext)]
+            if stamp.isdigit():
+                archives.append((int(stamp), os.path.join(directory, entry)))
+    return [path for _, path in sorted(archives, reverse=True)]
+
+
+def _tail_records(path: str, n: int) -> list:
+    """mmap 后从文件尾部反向查找换行，读取最多 n 条有效记录（从新到旧），不读取、不解码整个文件"""
+    records = []
     try:
-        with open(history_file, 'w', encoding='utf-8') as f:
-            json.dump(history, f, ensure_ascii=False, indent=2)
-    except Exception:
-        # 忽略文件写入错误，不影响命令执行
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return records
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                end = mm.size()
+                while end > 0 and len(records) < n:
+                    start = mm.rfind(b"\n", 0, end) + 1
+                    line = mm[start:end]
+                    end = start - 1
+                    if not line.strip():
+                        continue
+                    try:
+                        records.append(json_loads(line))
+                    except ValueError:
+                        continue  # 写入中断留下的残行
+    except OSError:
         pass
+    return records
+
+
+def tail_command_history(n: int = 20) -> list:
+    """读取最近 n 条历史记录（从旧到新）；当前文件不足 n 条时继续读取最近的归档文件"""
+    if n <= 0:
+        return []
+    flush_command_history()
+    records = _tail_records(HISTORY_FILE, n)
+    if len(records) < n:
+        for path in _history_archives():
+            records += _tail_records(path, n - len(records))
+            if len(records) >= n:
+                break
+    records.reverse()
+    return records
+
+SAFE_ASSESSMENT = {
+    "level": SAFETY_LEVELS["SAFE"],
+    "level_name": "SAFE",
+    "reason": "Command appears to be safe",
+    "requires_approval": False
+}
+
+# 超长命令不做模式匹配，直接要求人工批准
+MAX_COMMAND_LEN = 4096
+
+
+def _union_pattern(patterns: list) -> "re.Pattern":
+    """把模式列表合并为一个正则，一次扫描即可判定是否有模式命中"""
+    return re.compile("|".join(f"(?:{p})" for p in patterns))
+
+
+def _first_match(compiled: list, command: str) -> str:
+    """联合正则命中后按列表顺序找出第一个命中的模式，理由与逐条匹配时一致（只在命中时走到这里）"""
+    for pattern in compiled:
+        if pattern.search(command):
+            return pattern.pattern
+
+
+def _literal_tokens(patterns: list) -> Optional[tuple]:
+    """提取每个模式开头的字面命令名（形如 word\\s...）；任一模式不是这种形式时返回 None，不做预筛选"""
+    tokens = set()
+    for p in patterns:
+        m = re.match(r"\w+(?=\\s)", p)
+        if m is None:
+            return None
+        tokens.add(m.group())
+    # 包含更短命令名的（rmdir 含 rm、umount 含 mount）无需单独查找
+    return tuple(t for t in sorted(tokens) if not any(o != t and o in t for o in tokens))
+
+
+_DANGEROUS_RE = _union_pattern(dangerous_commands)
+_WARNING_RE = _union_pattern(warning_commands)
+_DANGEROUS_EACH = [re.compile(p) for p in dangerous_commands]
+_WARNING_EACH = [re.compile(p) for p in warning_commands]
+# 命令中不含任何模式的字面命令名时必然不匹配，用 str 子串查找跳过正则
+_LITERAL_TOKENS = _literal_tokens(dangerous_commands + warning_commands)
+_LITERAL_AC = ahocorasick_rs.AhoCorasick(list(_LITERAL_TOKENS)) if ahocorasick_rs and _LITERAL_TOKENS else None
+
+
+def _has_literal_token(command: str) -> bool:
+    if _LITERAL_TOKENS is None:
+        return True
+    if _LITERAL_AC is not None:
+        return bool(_LITERAL_AC.find_matches_as_indexes(command))
+    return any(tok in command for tok in _LITERAL_TOKENS)
+
 
 def assess_command_safety(command: str) -> Dict[str, Any]:
     """评估命令安全等级
@@ -115,33 +322,50 @@ def assess_command_safety(command: str) -> Dict[str, Any]:
     Returns:
         包含安全等级和评估信息的字典
     """
+    if len(command) > MAX_COMMAND_LEN:
+        return {
+            "level": SAFETY_LEVELS["DANGEROUS"],
+            "level_name": "DANGEROUS",
+            "reason": f"Command exceeds {MAX_COMMAND_LEN} characters",
+            "requires_approval": True
+        }
+    # 评估结果按命令缓存，返回副本以免调用方修改缓存
+    return dict(_assess_command_safety(command))
+
+
+@lru_cache(maxsize=1024)
+def _assess_command_safety(command: str) -> Dict[str, Any]:
+    if not _has_literal_token(command):
+        return SAFE_ASSESSMENT
+    
     # 检查危险命令
-    for pattern in dangerous_commands:
-        if re.search(pattern, command):
-            return {
-                "level": SAFETY_LEVELS["DANGEROUS"],
-                "level_name": "DANGEROUS",
-                "reason": f"Command matches dangerous pattern: {pattern}",
-                "requires_approval": True
-            }
+    if _DANGEROUS_RE.search(command):
+        return {
+            "level": SAFETY_LEVELS["DANGEROUS"],
+            "level_name": "DANGEROUS",
+            "reason": f"Command matches dangerous pattern: {_first_match(_DANGEROUS_EACH, command)}",
+            "requires_approval": True
+        }
     
     # 检查警告命令
-    for pattern in warning_commands:
-        if re.search(pattern, command):
-            return {
-                "level": SAFETY_LEVELS["WARNING"],
-                "level_name": "WARNING",
-                "reason": f"Command matches warning pattern: {pattern}",
-                "requires_approval": True
-            }
+    if _WARNING_RE.search(command):
+        return {
+            "level": SAFETY_LEVELS["WARNING"],
+            "level_name": "WARNING",
+            "reason": f"Command matches warning pattern: {_first_match(_WARNING_EACH, command)}",
+            "requires_approval": True
+        }
     
     # 默认安全命令
-    return {
-        "level": SAFETY_LEVELS["SAFE"],
-        "level_name": "SAFE",
-        "reason": "Command appears to be safe",
-        "requires_approval": False
-    }
+    return SAFE_ASSESSMENT
+
+def approval_id_for(arguments: Dict[str, Any]) -> str:
+    """按参数内容生成批准 ID：键排序后的 JSON 做 blake2b，跨进程、跨重启稳定"""
+    if orjson is not None:
+        raw = orjson.dumps(arguments, option=orjson.OPT_SORT_KEYS)
+    else:
+        raw = json.dumps(arguments, sort_keys=True, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return hashlib.blake2b(raw, digest_size=16).hexdigest()
 
 # ===================== Terminal MCP服务器 =====================
 class TerminalMCPServer:
@@ -149,6 +373,9 @@ class TerminalMCPServer:
         self.name = name
         self.tools = {}
         self.schemas = {}
+        self.kinds = {}  # 工具名 -> TOOL_SYNC / TOOL_ASYNC / TOOL_ASYNC_GEN
+        self._tools_list = None  # tools/list 缓存，工具在初始化时一次性注册
+        self._tools_list_bytes = None
         self.working_directory = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", ".."))  # 默认项目根目录
         self._register_tools()
     
@@ -232,14 +459,21 @@ class TerminalMCPServer:
                 }
             }
         }
+        
+        # 工具类型在注册时判定一次，分发时直接查表
+        self.kinds = {name: tool_kind(func) for name, func in self.tools.items()}
     
     def initialize(self, client_info=None, capabilities=None):
         """初始化MCP服务器"""
         # 从client_info中获取工作目录
         if client_info and isinstance(client_info, dict):
             custom_working_dir = client_info.get("working_directory")
-            if custom_working_dir and os.path.exists(custom_working_dir):
-                self.working_directory = os.path.abspath(custom_working_dir)
+            # 与当前目录相同（客户端每次握手都会带上）时跳过文件系统检查
+            if (custom_working_dir and custom_working_dir != self.working_directory
+                    and os.path.exists(custom_working_dir)):
+                if not os.path.isabs(custom_working_dir):
+                    custom_working_dir = os.path.abspath(custom_working_dir)
+                self.working_directory = custom_working_dir
         
         return {
             "protocolVersion": "2024-11-05",
@@ -247,11 +481,57 @@ class TerminalMCPServer:
             "tools": self.list_tools()
         }
     
+    @property
+    def working_directory(self) -> str:
+        return self._working_directory
+
+    @working_directory.setter
+    def working_directory(self, path: str):
+        self._working_directory = path
+        self._cwd = os.fsencode(path)  # 传给子进程的 cwd，预先编码避免每次启动进程时转换
+
     def list_tools(self):
         """列出所有工具"""
-        return list(self.schemas.values())
+        if self._tools_list is None:
+            self._tools_list = list(self.schemas.values())
+        return self._tools_list
+
+    def tools_list_bytes(self) -> bytes:
+        """预序列化的工具列表"""
+        if self._tools_list_bytes is None:
+            self._tools_list_bytes = json_dumps(self.list_tools())
+        return self._tools_list_bytes
     
-    def execute_command(self, command: str, timeout: int = 30) -> Dict[str, Any]:
+    async def _spawn(self, command: str, stderr) -> asyncio.subprocess.Process:
+        """启动子进程：简单命令直接 exec，含 shell 语法的命令交给 shell"""
+        argv = split_simple_command(command)
+        if argv is not None:
+            try:
+                return await asyncio.create_subprocess_exec(
+                    *argv, stdout=asyncio.subprocess.PIPE, stderr=stderr, cwd=self._cwd
+                )
+            except FileNotFoundError:
+                # 缓存的查找结果已过期（程序在首次查找后被删除），交给 shell 按常规返回 127
+                _which.cache_clear()
+        return await asyncio.create_subprocess_shell(
+            command, stdout=asyncio.subprocess.PIPE, stderr=stderr, cwd=self._cwd
+        )
+
+    async def _run_command(self, command: str, timeout: int) -> subprocess.CompletedProcess:
+        """异步执行命令并收集输出，不阻塞事件循环；超时则结束进程并抛出 TimeoutExpired"""
+        process = await self._spawn(command, asyncio.subprocess.PIPE)
+        try:
+            stdout, stderr = await asyncio.wait_for(process.communicate(), timeout=timeout)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            raise subprocess.TimeoutExpired(command, timeout)
+        return subprocess.CompletedProcess(
+            command, process.returncode,
+            stdout.decode("utf-8", "replace"), stderr.decode("utf-8", "replace")
+        )
+
+    async def execute_command(self, command: str, timeout: int = 30) -> Dict[str, Any]:
         """执行终端命令并返回结果"""
         # 评估命令安全等级
         safety_assessment = assess_command_safety(command)
@@ -268,14 +548,7 @@ class TerminalMCPServer:
         
         try:
             # 执行命令
-            result = subprocess.run(
-                command, 
-                shell=True, 
-                capture_output=True, 
-                text=True, 
-                timeout=timeout,
-                cwd=self.working_directory
-            )
+            result = await self._run_command(command, timeout)
             
             # 记录命令历史
             record_command_history(
@@ -338,8 +611,8 @@ class TerminalMCPServer:
                 "error_type": type(e).__name__
             }
     
-    async def execute_command_stream(self, command: str, timeout: int = 60) -> AsyncGenerator[Dict[str, Any], None]:
-        """流式执行终端命令并实时返回结果"""
+    async def execute_command_stream(self, command: str, timeout: int = 60) -> AsyncGenerator[Any, None]:
+        """流式执行终端命令并实时返回结果（stdout 事件为已编码的 JSON 字节，其余事件为字典）"""
         # 评估命令安全等级
         safety_assessment = assess_command_safety(command)
         
@@ -357,43 +630,58 @@ class TerminalMCPServer:
             }
             return
         
-        stdout_output = []
-        stderr_output = []
+        stdout_raw = bytearray()  # 原始输出字节，只在记录历史时解码一次
         returncode = -1
+        process = None
         
         try:
             # 启动子进程
-            process = subprocess.Popen(
-                command, 
-                shell=True, 
-                stdout=subprocess.PIPE, 
-                stderr=subprocess.STDOUT,  # 合并 stderr 到 stdout
-                text=True,
-                bufsize=1,  # 行缓冲
-                cwd=self.working_directory
-            )
+            process = await self._spawn(command, asyncio.subprocess.STDOUT)  # 合并 stderr 到 stdout
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + timeout
             
-            # 实时读取输出
-            for line in iter(process.stdout.readline, ''):
-                if line:
-                    stdout_output.append(line.strip())
-                    yield {
-                        "type": "stdout",
-                        "data": line.strip(),
-                        "command": command,
-                        "safety_assessment": safety_assessment
-                    }
-                    await asyncio.sleep(0.01)  # 让出控制权
+            # stdout 事件除 data 外的字段在整个命令期间不变，预先编码一次；事件以已编码的 JSON 字节产出
+            stdout_prefix = b'{"type":"stdout","data":'
+            stdout_suffix = (b',"command":' + json_dumps(command) + b',"safety_assessment":'
+                             + json_dumps(safety_assessment) + b"}")
+            
+            # 按块读取输出：一次读取可包含多行，每块只产出一个事件，只在行边界切分
+            decoder = codecs.getincrementaldecoder("utf-8")("replace")
+            pending = ""
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(process.stdout.read(STREAM_READ_SIZE), deadline - loop.time())
+                except asyncio.TimeoutError:
+                    raise subprocess.TimeoutExpired(command, timeout)
+                stdout_raw += chunk
+                pending += decoder.decode(chunk, final=not chunk)
+                if chunk:
+                    cut = pending.rfind("\n")
+                    if cut < 0 and len(pending) < STREAM_READ_SIZE:
+                        continue  # 尚无完整行，继续读取
+                    if cut >= 0:
+                        block, pending = pending[:cut], pending[cut + 1:]
+                    else:
+                        block, pending = pending, ""  # 超长无换行的输出整体输出
+                else:
+                    block, pending = pending, ""
+                if block:
+                    yield stdout_prefix + json_dumps(block) + stdout_suffix
+                if not chunk:
+                    break
             
             # 等待进程结束
-            returncode = process.wait(timeout=timeout)
+            try:
+                returncode = await asyncio.wait_for(process.wait(), max(0.0, deadline - loop.time()))
+            except asyncio.TimeoutError:
+                raise subprocess.TimeoutExpired(command, timeout)
             
             # 记录命令历史
             record_command_history(
                 command=command,
                 success=True,
                 returncode=returncode,
-                stdout="\n".join(stdout_output),
+                stdout=stdout_raw.decode("utf-8", "replace"),
                 stderr="",
                 safety_assessment=safety_assessment,
                 working_directory=self.working_directory
@@ -416,7 +704,7 @@ class TerminalMCPServer:
                 command=command,
                 success=False,
                 returncode=-1,
-                stdout="\n".join(stdout_output),
+                stdout=stdout_raw.decode("utf-8", "replace"),
                 stderr=f"Command timed out after {timeout} seconds",
                 safety_assessment=safety_assessment,
                 working_directory=self.working_directory
@@ -437,7 +725,7 @@ class TerminalMCPServer:
                 command=command,
                 success=False,
                 returncode=-1,
-                stdout="\n".join(stdout_output),
+                stdout=stdout_raw.decode("utf-8", "replace"),
                 stderr=str(e),
                 safety_assessment=safety_assessment,
                 working_directory=self.working_directory
@@ -452,22 +740,20 @@ class TerminalMCPServer:
                     "safety_assessment": safety_assessment
                 }
             }
+        finally:
+            # 超时或客户端提前断开时结束仍在运行的子进程
+            if process is not None and process.returncode is None:
+                process.kill()
+                await process.wait()
     
-    def approve_command(self, command: str, approval_id: str, timeout: int = 30) -> Dict[str, Any]:
+    async def approve_command(self, command: str, approval_id: str, timeout: int = 30) -> Dict[str, Any]:
         """批准并执行命令"""
         # 评估命令安全等级
         safety_assessment = assess_command_safety(command)
         
         try:
             # 执行命令
-            result = subprocess.run(
-                command, 
-                shell=True, 
-                capture_output=True, 
-                text=True, 
-                timeout=timeout,
-                cwd=self.working_directory
-            )
+            result = await self._run_command(command, timeout)
 
             # 记录命令历史
             record_command_history(
@@ -534,7 +820,9 @@ class TerminalMCPServer:
 mcp = TerminalMCPServer()
 
 # ===================== FastAPI应用 =====================
-app = FastAPI(title=mcp.name, version="1.0.0")
+# 有 orjson 时所有非流式响应都用 orjson 序列化
+app = FastAPI(title=mcp.name, version="1.0.0",
+              default_response_class=ORJSONResponse if orjson is not None else JSONResponse)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -545,8 +833,23 @@ app.add_middleware(
 @app.post("/mcp")
 async def mcp_endpoint(req: Request):
     """MCP服务器端点"""
+    payload = None
     try:
-        payload = await req.json()
+        try:
+            payload = json_loads(await req.body())
+        except ValueError as e:
+            return {
+                "jsonrpc": "2.0",
+                "id": None,
+                "error": {
+                    "code": -32700,
+                    "message": f"Parse error: {e}"
+                }
+            }
+        if not isinstance(payload, dict):
+            # 不支持 JSON-RPC batch（列表）等非对象请求
+            return Response(content=rpc_error_bytes(None, -32600, "Invalid Request: expected a JSON object"),
+                            media_type="application/json")
         method = payload.get("method")
         params = payload.get("params", {})
         
@@ -562,15 +865,12 @@ async def mcp_endpoint(req: Request):
             }
         
         elif method == "tools/list":
-            result = mcp.list_tools()
-            return {
-                "jsonrpc": "2.0",
-                "id": payload.get("id"),
-                "result": result
-            }
+            # 只有 id 需要按请求编码，工具列表直接拼接缓存的字节
+            body = b'{"jsonrpc":"2.0","id":' + json_dumps(payload.get("id")) + b',"result":' + mcp.tools_list_bytes() + b"}"
+            return Response(content=body, media_type="application/json")
         
         elif method == "tools/call":
-            tool_name = params["name"]
+            tool_name = sys.intern(params["name"])
             arguments = params.get("arguments", {})
             
             if tool_name not in mcp.tools:
@@ -584,39 +884,40 @@ async def mcp_endpoint(req: Request):
                 }
             
             func = mcp.tools[tool_name]
+            kind = mcp.kinds[tool_name]
+            # 信封前后缀每个请求只编码一次，每个事件只序列化 result 本身
+            prefix = b'{"jsonrpc":"2.0","id":' + json_dumps(payload.get("id")) + b',"result":'
+            suffix = b"}\n"
+            sse = wants_sse(req.headers)
+            if sse:
+                # SSE 分帧：紧凑 JSON 不含换行，单条 data 行 + 空行即一个事件
+                prefix, suffix = b"data: " + prefix, b"}\n\n"
             
             async def stream_response():
-                if inspect.isasyncgenfunction(func):
+                if kind == TOOL_ASYNC_GEN:
                     # 处理异步生成器
                     async for item in func(**arguments):
-                        yield json.dumps({
-                            "jsonrpc": "2.0",
-                            "id": payload.get("id"),
-                            "result": item
-                        }, ensure_ascii=False) + "\n"
-                elif asyncio.iscoroutinefunction(func):
+                        # bytes 表示工具已编码好的 JSON，直接拼接
+                        yield prefix + (item if isinstance(item, bytes) else json_dumps(item)) + suffix
+                elif kind == TOOL_ASYNC:
                     # 处理普通异步函数
                     result = await func(**arguments)
-                    yield json.dumps({
-                        "jsonrpc": "2.0",
-                        "id": payload.get("id"),
-                        "result": result
-                    }, ensure_ascii=False) + "\n"
+                    yield prefix + json_dumps(result) + suffix
                 else:
-                    # 处理同步函数
-                    result = func(**arguments)
-                    yield json.dumps({
-                        "jsonrpc": "2.0",
-                        "id": payload.get("id"),
-                        "result": result
-                    }, ensure_ascii=False) + "\n"
+                    # 处理同步函数，放到线程池执行以免阻塞事件循环
+                    result = await asyncio.to_thread(func, **arguments)
+                    yield prefix + json_dumps(result) + suffix
             
-            return StreamingResponse(stream_response(), media_type="application/json")
+            if sse:
+                return StreamingResponse(stream_response(), media_type="text/event-stream", headers=SSE_HEADERS)
+            return StreamingResponse(stream_response(), media_type="application/x-ndjson")
         
         elif method == "tools/approve":
             tool_name = params.get("name", "approve_command")
             arguments = params.get("arguments", {})
-            approval_id = params.get("approval_id", str(hash(str(arguments))))
+            approval_id = params.get("approval_id")
+            if approval_id is None:
+                approval_id = approval_id_for(arguments)
             
             # 构建批准命令的参数
             approve_args = {
@@ -636,7 +937,7 @@ async def mcp_endpoint(req: Request):
                 }
             
             # 调用批准命令工具
-            result = mcp.tools["approve_command"](**approve_args)
+            result = await mcp.tools["approve_command"](**approve_args)
             
             return {
                 "jsonrpc": "2.0",
@@ -655,14 +956,8 @@ async def mcp_endpoint(req: Request):
             }
     
     except Exception as e:
-        return {
-            "jsonrpc": "2.0",
-            "id": payload.get("id") if 'payload' in locals() else None,
-            "error": {
-                "code": -32603,
-                "message": str(e)
-            }
-        }
+        body = rpc_error_bytes(payload.get("id") if isinstance(payload, dict) else None, -32603, str(e))
+        return Response(content=body, media_type="application/json")
 
 @app.get("/health")
 async def health():
@@ -681,4 +976,4 @@ if __name__ == "__main__":
     for tool_name in mcp.tools.keys():
         print(f"   - {tool_name}")
     print(f"🌐 服务地址: http://localhost:8001/mcp")
-    uvicorn.run(app, host="0.0.0.0", port=8001)
+    uvicorn.run(app, host="0.0.0.0", port=8001, **uvicorn_options())
@@ -0,0 +1,102 @@
+"""
+MCP 流式响应分帧与转发
+
+把上游任意切分的字节块还原为完整消息帧，供 MCPHub.call_tool_stream 使用；
+bounded_stream 在上游流与HTTP响应之间提供有界缓冲。
+分帧逻辑独立成模块，热路径只依赖 bytearray 的 C 层 find/切片，不引入其它依赖。
+"""
+import asyncio
+from typing import AsyncGenerator
+
+
+class StreamFramer:
+    """增量分帧器：把任意切分的字节块还原为完整的消息帧
+
+    同时兼容两种上游格式：
+    - 按行分隔的 JSON（NDJSON / Streamable MCP），每个非空行即一帧；
+    - SSE，连续的 ``data:`` 行在空行处合并为一帧，其余字段（event/id/retry/注释）忽略。
+    只有完整的帧才会被交给调用方解码，未完成的尾部留在缓冲区等待下一个块。
+    """
+
+    _SSE_FIELDS = (b"event:", b"id:", b"retry:", b":")
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._event: list = []  # 当前SSE事件已累积的data行
+
+    def feed(self, chunk: bytes) -> list:
+        buf = self._buffer
+        buf += chunk
+        frames = []
+        idx = buf.find(b"\n")
+        if idx < 0:
+            return frames
+        # 按偏移扫描完整行，每行只拷贝一次；已消费的前缀在最后一次性丢弃
+        start = 0
+        with memoryview(buf) as mv:
+            while idx >= 0:
+                self._take_line(mv[start:idx].tobytes().strip(), frames)
+                start = idx + 1
+                idx = buf.find(b"\n", start)
+        del buf[:start]
+        return frames
+
+    def flush(self) -> list:
+        frames = []
+        line = bytes(self._buffer).strip()
+        self._buffer.clear()
+        if line:
+            self._take_line(line, frames)
+        if self._event:
+            frames.append(b"\n".join(self._event))
+            self._event = []
+        return frames
+
+    def _take_line(self, line: bytes, frames: list):
+        if not line:
+            # 空行：SSE事件结束
+            if self._event:
+                frames.append(b"\n".join(self._event))
+                self._event = []
+        elif line.startswith(b"data:"):
+            self._event.append(line.removeprefix(b"data:").removeprefix(b" "))
+        elif line.startswith(self._SSE_FIELDS):
+            pass
+        else:
+            frames.append(line)
+
+
+STREAM_QUEUE_SIZE = 64
+_STREAM_END = object()
+
+
+async def bounded_stream(source: AsyncGenerator, maxsize: int = STREAM_QUEUE_SIZE) -> AsyncGenerator:
+    """在上游流与HTTP响应之间加入有界队列
+
+    队列满时生产者的 put 会挂起，不再读取上游响应，背压一直传递到MCP服务器，
+    内存占用被限制在 maxsize 条消息以内。客户端断开时取消生产者并关闭上游流。
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+
+    async def produce():
+        try:
+            async for item in source:
+                await queue.put(item)
+        except Exception as e:
+            await queue.put(e)
+        else:
+            await queue.put(_STREAM_END)
+
+    producer = asyncio.create_task(produce())
+    try:
+        while True:
+            item = await queue.get()
+            if item is _STREAM_END:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        producer.cancel()
+        await asyncio.gather(producer, return_exceptions=True)
+        await source.aclose()
@@ -1,27 +1,36 @@
 # ===================== 数据模型 =====================
 from dataclasses import dataclass, field
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Callable, Optional
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class MCPServerConfig:
     name: str
     endpoint: str
     enabled: bool = True
     timeout: int = 30
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class ToolInfo:
     name: str
     server_name: str
     schema: Dict[str, Any]
+    # 预编码的 tools/call 参数前缀：,"params":{"name":"<name>","arguments":
+    call_prefix: bytes = b""
+    # 发现时从所属服务器配置带过来，调用路径无需再查 servers
+    endpoint: str = ""
+    timeout: int = 30
+    # "<server_name>.<name>"，发现时计算一次
+    full_name: str = ""
+    # 所属服务器的请求ID生成器（与 MCPHub.request_ids 共享同一计数器）
+    next_id: Optional[Callable[[], int]] = None
 
-    @property
-    def full_name(self):
-        return f"{self.server_name}.{self.name}"
+    def __post_init__(self):
+        if not self.full_name:
+            object.__setattr__(self, "full_name", f"{self.server_name}.{self.name}")
 
 
-@dataclass
+@dataclass(slots=True)
 class MCPServersConfig:
     """MCP服务器配置列表"""
     servers: List[MCPServerConfig] = field(default_factory=list)
@@ -36,7 +45,7 @@ class MCPServersConfig:
   #     "arguments": "{\"query\":\"abc\"}" // JSON 字符串！不是 dict！
   #   }
   # }
-@dataclass
+@dataclass(slots=True, frozen=True)
 class MCPToolCallRequest:
     id: str
     type: str = "function"
@@ -0,0 +1,8 @@
+import sys
+from pathlib import Path
+
+# 测试直接导入项目根目录与 mcp_server/ 下的模块
+ROOT = Path(__file__).resolve().parents[1]
+for path in (ROOT, ROOT / "mcp_server"):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
@@ -0,0 +1,140 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+
+pytest.importorskip("httpx")
+
+from mcp_hub import MCPHub, json_loads, tool_call_prefix
+from mcp_sse import bounded_stream
+from model import MCPServerConfig, ToolInfo
+
+
+def test_admit_limits_concurrency_and_releases():
+    hub = MCPHub(max_inflight=2)
+    state = {"peak": 0}
+
+    async def worker(release: asyncio.Event):
+        async with hub._admit():
+            state["peak"] = max(state["peak"], hub.inflight)
+            await release.wait()
+
+    async def run():
+        release = asyncio.Event()
+        tasks = [asyncio.create_task(worker(release)) for _ in range(5)]
+        await asyncio.sleep(0.01)
+        assert hub.inflight == 2
+        release.set()
+        await asyncio.gather(*tasks)
+        assert state["peak"] == 2
+        assert hub.inflight == 0
+
+    asyncio.run(run())
+
+
+def test_admit_releases_on_error_and_cancel():
+    hub = MCPHub(max_inflight=1)
+
+    async def failing():
+        async with hub._admit():
+            raise RuntimeError("boom")
+
+    async def holder(started: asyncio.Event):
+        async with hub._admit():
+            started.set()
+            await asyncio.sleep(3600)
+
+    async def run():
+        with pytest.raises(RuntimeError):
+            await failing()
+        assert hub.inflight == 0
+
+        started = asyncio.Event()
+        held = asyncio.create_task(holder(started))
+        await started.wait()
+        # 等待名额时被取消，不占用名额
+        waiting = asyncio.create_task(failing())
+        await asyncio.sleep(0.01)
+        waiting.cancel()
+        await asyncio.gather(waiting, return_exceptions=True)
+        assert hub.inflight == 1
+        # 持有名额时被取消，名额归还
+        held.cancel()
+        await asyncio.gather(held, return_exceptions=True)
+        assert hub.inflight == 0
+        async with hub._admit():
+            assert hub.inflight == 1
+
+    asyncio.run(run())
+
+
+def test_set_max_inflight_wakes_waiters():
+    hub = MCPHub(max_inflight=1)
+
+    async def run():
+        release = asyncio.Event()
+
+        async def worker():
+            async with hub._admit():
+                await release.wait()
+
+        tasks = [asyncio.create_task(worker()) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        assert hub.inflight == 1
+        await hub.set_max_inflight(3)
+        await asyncio.sleep(0.01)
+        assert hub.inflight == 3
+        release.set()
+        await asyncio.gather(*tasks)
+        assert hub.inflight == 0
+
+    asyncio.run(run())
+
+
+class _StreamResp:
+    status_code = 200
+
+    def __init__(self, state):
+        self.state = state
+
+    async def aiter_bytes(self):
+        while True:
+            self.state["sent"] += 1
+            yield b'{"jsonrpc":"2.0","id":1,"result":' + str(self.state["sent"]).encode() + b"}\n"
+            await asyncio.sleep(0)
+
+
+class _StreamClient:
+    is_closed = False
+
+    def __init__(self):
+        self.state = {"sent": 0, "closed": False}
+
+    @asynccontextmanager
+    async def stream(self, method, url, **kwargs):
+        try:
+            yield _StreamResp(self.state)
+        finally:
+            self.state["closed"] = True
+
+
+def test_call_tool_stream_disconnect_releases_slot():
+    hub = MCPHub(max_inflight=1)
+    hub.add_server(MCPServerConfig(name="local", endpoint="http://a/mcp"))
+    hub._set_health("local", True)
+    hub.tools = {("local", "tick"): ToolInfo(name="tick", server_name="local", schema={},
+                                             call_prefix=tool_call_prefix("tick"), endpoint="http://a/mcp",
+                                             next_id=hub.request_ids["local"])}
+    client = _StreamClient()
+    hub.client = client
+
+    async def run():
+        stream = bounded_stream(hub.call_tool_stream("local.tick", {}), maxsize=2)
+        assert json_loads(await stream.__anext__()) == {"success": True, "result": 1}
+        assert hub.inflight == 1
+        # 客户端断开
+        await stream.aclose()
+        assert client.state["closed"]
+        assert hub.inflight == 0
+
+    asyncio.run(run())
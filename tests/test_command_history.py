@@ -0,0 +1,53 @@
+import pytest
+
+pytest.importorskip("fastapi")
+
+import terminal_mcp_server as tms
+
+
+@pytest.fixture
+def history(tmp_path, monkeypatch):
+    monkeypatch.setattr(tms, "HISTORY_FILE", str(tmp_path / "command_history.jsonl"))
+    monkeypatch.setattr(tms, "MAX_HISTORY_BYTES", 200)
+    monkeypatch.setattr(tms, "_history_fh", None)
+    yield tmp_path
+    tms.flush_command_history()
+    if tms._history_fh is not None:
+        tms._history_fh.close()
+
+
+def _record(i: int):
+    tms.record_command_history(f"echo {i}", True, 0, f"{i}\n", "", tms.SAFE_ASSESSMENT, "/tmp")
+
+
+def _commands(records):
+    return [r["command"] for r in records]
+
+
+def test_tail_spans_rotated_archive(history):
+    for i in range(3):
+        _record(i)
+    tms.flush_command_history()
+    for i in range(3, 5):
+        _record(i)
+    tms.flush_command_history()  # 文件已超过 MAX_HISTORY_BYTES，先归档再写入
+
+    assert len(tms._history_archives()) == 1
+    assert _commands(tms.tail_command_history(2)) == ["echo 3", "echo 4"]
+    assert _commands(tms.tail_command_history(4)) == ["echo 1", "echo 2", "echo 3", "echo 4"]
+    assert _commands(tms.tail_command_history(50)) == [f"echo {i}" for i in range(5)]
+    assert tms.tail_command_history(0) == []
+
+
+def test_tail_skips_partial_last_line(history):
+    for i in range(3):
+        _record(i)
+    tms.flush_command_history()
+    with open(tms.HISTORY_FILE, "ab") as f:
+        f.write(b'{"command": "echo trunc')  # 写入中断留下的残行
+
+    assert _commands(tms.tail_command_history(2)) == ["echo 1", "echo 2"]
+
+
+def test_tail_without_history_file(history):
+    assert tms.tail_command_history(5) == []
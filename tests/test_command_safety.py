@@ -0,0 +1,114 @@
+import random
+import re
+import time
+
+import pytest
+
+pytest.importorskip("fastapi")
+
+import terminal_mcp_server as tms
+from terminal_mcp_server import MAX_COMMAND_LEN, assess_command_safety, dangerous_commands, warning_commands
+
+# 改写前逐条匹配的原始模式，作为判定结果的基准
+BASELINE_DANGEROUS = [
+    r'rm\s+-rf', r'sudo\s+', r'format\s+', r'dd\s+', r'chmod\s+[0-7]{3}', r'chown\s+', r'kill\s+-9',
+    r'shutdown\s+', r'reboot\s+', r'init\s+', r'mkfs\s+', r'fsck\s+', r'mount\s+', r'umount\s+',
+    r'iptables\s+', r'curl\s+.*>.*', r'wget\s+.*>.*', r'echo\s+.*>.*', r'cat\s+.*>.*', r'touch\s+/etc/.*',
+    r'rmdir\s+/.*', r'mv\s+/.*', r'cp\s+/.*', r'git\s+/.*',
+]
+BASELINE_WARNING = [
+    r'rm\s+', r'mkdir\s+-p\s+/.*', r'cd\s+/.*', r'ls\s+-la\s+/.*', r'find\s+/.*', r'grep\s+.*>/.*',
+    r'sort\s+.*>/.*', r'uniq\s+.*>/.*',
+]
+
+TOKENS = ["rm", "-rf", "sudo", "dd", "chmod", "755", "kill", "-9", "curl", "wget", "echo", "cat", "touch", "/etc/",
+          "rmdir", "mv", "cp", "git", "mkdir", "-p", "cd", "ls", "-la", "find", "grep", "sort", "uniq", "mount",
+          ">", ">/", "> /", "/", "x", "a>b", " ", "  ", "\t", "\n", "\r\n", " \n ", "|", ";", "&&"]
+
+
+def baseline(command: str):
+    """改写前的判定：按列表顺序逐条 re.search，返回 (等级, 命中模式下标)"""
+    for i, p in enumerate(BASELINE_DANGEROUS):
+        if re.search(p, command):
+            return "DANGEROUS", i
+    for i, p in enumerate(BASELINE_WARNING):
+        if re.search(p, command):
+            return "WARNING", i
+    return "SAFE", None
+
+
+def current(command: str):
+    result = assess_command_safety(command)
+    level = result["level_name"]
+    if level == "SAFE":
+        return level, None
+    pattern = result["reason"].split(" pattern: ", 1)[1]
+    patterns = dangerous_commands if level == "DANGEROUS" else warning_commands
+    return level, patterns.index(pattern)
+
+
+@pytest.mark.parametrize("command", [
+    "rm -rf /", "sudo ls", "dd if=/dev/zero of=disk", "chmod 777 file", "kill -9 1", "mount /dev/sda1 /mnt",
+    "curl http://x > out", "wget -O - http://x > f", "echo hi > /etc/passwd", "cat a > b", "touch /etc/x",
+    "rmdir /tmp/x", "mv /etc/a b", "cp /etc/a b", "ls; sudo reboot now", "curl\n\nfoo > x",
+])
+def test_dangerous_commands(command):
+    assert current(command)[0] == "DANGEROUS"
+    assert current(command) == baseline(command)
+
+
+@pytest.mark.parametrize("command", [
+    "rm file", "mkdir -p /tmp/a", "cd /tmp", "ls -la /", "find / -name x", "grep x f >/tmp/o",
+    "sort f >/tmp/o", "uniq f >/tmp/o",
+])
+def test_warning_commands(command):
+    assert current(command)[0] == "WARNING"
+    assert current(command) == baseline(command)
+
+
+@pytest.mark.parametrize("command", [
+    "", "ls", "pwd", "echo hi", "git status", "python -V", "cat file", "grep x f > out",
+    "curl x\ny > z", "grep a\n>/x", "echo a\n> b",
+])
+def test_safe_commands(command):
+    assert current(command) == ("SAFE", None)
+    assert baseline(command) == ("SAFE", None)
+
+
+def test_matches_baseline_on_random_commands():
+    rng = random.Random(0)
+    for _ in range(5000):
+        command = "".join(rng.choice(TOKENS) for _ in range(rng.randint(1, 12)))
+        assert current(command) == baseline(command), repr(command)
+
+
+class _Unreachable:
+    def search(self, command):
+        raise AssertionError("正则不应被调用")
+
+
+def test_prefilter_skips_regex_without_literal_tokens(monkeypatch):
+    monkeypatch.setattr(tms, "_DANGEROUS_RE", _Unreachable())
+    monkeypatch.setattr(tms, "_WARNING_RE", _Unreachable())
+    tms._assess_command_safety.cache_clear()
+    try:
+        for command in ("pwd", "python -V > out", "pwd\n\npwd", "/usr/bin/env"):
+            assert assess_command_safety(command)["level_name"] == "SAFE"
+    finally:
+        tms._assess_command_safety.cache_clear()
+
+
+def test_over_length_command_requires_approval():
+    result = assess_command_safety("a" * (MAX_COMMAND_LEN + 1))
+    assert result["level_name"] == "DANGEROUS"
+    assert result["requires_approval"]
+    assert str(MAX_COMMAND_LEN) in result["reason"]
+    assert assess_command_safety("a" * MAX_COMMAND_LEN)["level_name"] == "SAFE"
+
+
+def test_long_adversarial_inputs_stay_fast():
+    n = MAX_COMMAND_LEN - 16
+    started = time.perf_counter()
+    for command in ("curl" + " " * n, "curl " + " \n" * (n // 2), "grep " + ">" * n, "echo " + "\t" * n + "x"):
+        assess_command_safety(command)
+    assert time.perf_counter() - started < 1.0
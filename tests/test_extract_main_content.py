@@ -0,0 +1,61 @@
+import random
+import re
+
+import pytest
+
+pytest.importorskip("httpx")
+pytest.importorskip("fastapi")
+
+from mcp_server_example import clean_text, extract_main_content
+
+SKIP_KEYWORDS = ['navigation', 'menu', 'footer', 'subscribe', 'cookie', 'privacy policy']
+
+
+def baseline_clean_text(text: str, max_length: int = 2000) -> str:
+    if not text:
+        return ""
+    text = re.sub(r'\s+', ' ', text)
+    text = re.sub(r'[\x00-\x1f\x7f-\x9f]', '', text)
+    if len(text) > max_length:
+        text = text[:max_length] + "..."
+    return text.strip()
+
+
+def baseline_extract_main_content(html_text: str, max_length: int = 1500) -> str:
+    """改写前的逐行实现，作为结果基准"""
+    if not html_text:
+        return ""
+    content_lines = []
+    for line in html_text.split('\n'):
+        line_lower = line.lower()
+        if any(keyword in line_lower for keyword in SKIP_KEYWORDS):
+            continue
+        if line.strip():
+            content_lines.append(line.strip())
+    return baseline_clean_text(' '.join(content_lines), max_length)
+
+
+PIECES = ["Title", "Some body text here.", "Footer links", "MENU", "Cookie policy", "privacy policy", "İstanbul",
+          "中文内容", "a", " ", "  ", "\t", "\n", "\r\n", "\n\n", "\x00", "\x1f", "\x85", "　", "nav", "igation"]
+
+
+def test_trailing_whitespace_does_not_trigger_truncation():
+    text = "Title\nSome body text here.\n\nFooter links\n"
+    assert extract_main_content(text, 26) == "Title Some body text here."
+    assert extract_main_content(text, 26) == baseline_extract_main_content(text, 26)
+
+
+def test_matches_baseline_on_random_pages():
+    rng = random.Random(0)
+    for _ in range(5000):
+        text = "".join(rng.choice(PIECES) for _ in range(rng.randint(0, 15)))
+        max_length = rng.randint(1, 60)
+        assert extract_main_content(text, max_length) == baseline_extract_main_content(text, max_length), repr(text)
+
+
+def test_clean_text_matches_baseline():
+    rng = random.Random(1)
+    for _ in range(2000):
+        text = "".join(rng.choice(PIECES) for _ in range(rng.randint(0, 10)))
+        max_length = rng.randint(1, 40)
+        assert clean_text(text, max_length) == baseline_clean_text(text, max_length), repr(text)
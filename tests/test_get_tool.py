@@ -0,0 +1,30 @@
+import pytest
+
+pytest.importorskip("httpx")
+
+from mcp_hub import MCPHub
+from model import ToolInfo
+
+
+def _hub(*keys):
+    hub = MCPHub()
+    hub.tools = {(server, tool): ToolInfo(name=tool, server_name=server, schema={}) for server, tool in keys}
+    return hub
+
+
+def test_plain_names():
+    hub = _hub(("local", "search"))
+    assert hub._get_tool("local.search").name == "search"
+    assert hub._get_tool("local.missing") is None
+    assert hub._get_tool("search") is None
+    assert hub._get_tool("") is None
+    assert hub._get_tool(None) is None
+
+
+def test_dotted_server_and_tool_names():
+    hub = _hub(("my.server", "search"), ("local", "fs.read"))
+    tool = hub._get_tool("my.server.search")
+    assert (tool.server_name, tool.name) == ("my.server", "search")
+    tool = hub._get_tool("local.fs.read")
+    assert (tool.server_name, tool.name) == ("local", "fs.read")
+    assert hub._get_tool("my.server.missing") is None
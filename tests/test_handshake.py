@@ -0,0 +1,62 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("httpx")
+
+from mcp_hub import MCPHub, json_dumps, json_loads
+from model import MCPServerConfig
+
+
+class _Resp:
+    def __init__(self, body: bytes):
+        self.status_code = 200
+        self.content = body
+
+    def raise_for_status(self):
+        pass
+
+
+class NoBatchClient:
+    """模拟不接受 batch 的 MCP 服务器：列表请求返回 -32600，单个请求正常应答"""
+
+    def __init__(self):
+        self.bodies = []
+
+    async def post(self, url, content=b"", **kwargs):
+        self.bodies.append(content)
+        payload = json_loads(content)
+        if isinstance(payload, list):
+            return _Resp(b'{"jsonrpc":"2.0","id":null,"error":{"code":-32600,"message":"Invalid Request"}}')
+        if payload["method"] == "initialize":
+            return _Resp(json_dumps({"jsonrpc": "2.0", "id": payload["id"], "result": {}}))
+        return _Resp(json_dumps({"jsonrpc": "2.0", "id": payload["id"], "result": {"tools": []}}))
+
+
+def test_no_batch_cached_per_endpoint():
+    hub = MCPHub()
+    config = MCPServerConfig(name="local", endpoint="http://a/mcp")
+    other = MCPServerConfig(name="other", endpoint="http://b/mcp")
+    hub.add_server(config)
+    hub.add_server(other)
+    client = NoBatchClient()
+
+    async def run():
+        init, tools = await hub._handshake("local", config, client)
+        assert init["result"] == {} and tools["result"] == {"tools": []}
+        assert len(client.bodies) == 3  # batch 被拒绝后回退为两次请求
+
+        # 同一 endpoint 重新登记后不再尝试 batch
+        await hub._disconnect_server("local")
+        hub.add_server(config)
+        client.bodies.clear()
+        await hub._handshake("local", config, client)
+        assert len(client.bodies) == 2
+        assert all(not body.startswith(b"[") for body in client.bodies)
+
+        # 其他 endpoint 仍先尝试 batch
+        client.bodies.clear()
+        await hub._handshake("other", other, client)
+        assert client.bodies[0].startswith(b"[")
+
+    asyncio.run(run())
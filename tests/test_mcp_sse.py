@@ -0,0 +1,121 @@
+import asyncio
+import random
+
+import pytest
+
+from mcp_sse import StreamFramer, bounded_stream
+
+# 混合 NDJSON 行与 SSE 事件（CRLF、多行 data、event/id/retry/注释字段、多字节字符）
+STREAM = (
+    b'{"jsonrpc":"2.0","id":1,"result":{"text":"\xe4\xb8\xad\xe6\x96\x87"}}\n'
+    b"event: message\r\n"
+    b"id: 7\r\n"
+    b'data: {"a":\r\n'
+    b"data: 1}\r\n"
+    b"\r\n"
+    b": keep-alive\n"
+    b"retry: 1000\n"
+    b"\n"
+    b"   \n"
+    b"data:no-space\n"
+    b"\n"
+    b"plain text line\r\n"
+    b"data: unterminated event"
+)
+EXPECTED = [
+    b'{"jsonrpc":"2.0","id":1,"result":{"text":"\xe4\xb8\xad\xe6\x96\x87"}}',
+    b'{"a":\n1}',
+    b"no-space",
+    b"plain text line",
+    b"unterminated event",
+]
+
+
+def _frames(chunks):
+    framer = StreamFramer()
+    frames = []
+    for chunk in chunks:
+        frames += framer.feed(chunk)
+    return frames + framer.flush()
+
+
+def _random_split(data: bytes, rng: random.Random):
+    cuts = sorted(rng.sample(range(1, len(data)), rng.randint(0, min(20, len(data) - 1))))
+    return [data[i:j] for i, j in zip([0] + cuts, cuts + [len(data)])]
+
+
+def test_framer_whole_stream():
+    assert _frames([STREAM]) == EXPECTED
+
+
+def test_framer_byte_by_byte():
+    assert _frames([STREAM[i:i + 1] for i in range(len(STREAM))]) == EXPECTED
+
+
+def test_framer_random_splits():
+    rng = random.Random(0)
+    for _ in range(500):
+        assert _frames(_random_split(STREAM, rng)) == EXPECTED
+
+
+def test_framer_incomplete_line_stays_buffered():
+    framer = StreamFramer()
+    assert framer.feed(b'{"a":') == []
+    assert framer.feed(b"1}") == []
+    assert framer.feed(b"\n") == [b'{"a":1}']
+    assert framer.flush() == []
+
+
+async def _items(n):
+    for i in range(n):
+        yield i
+
+
+async def _collect(agen):
+    return [item async for item in agen]
+
+
+def test_bounded_stream_preserves_order():
+    assert asyncio.run(_collect(bounded_stream(_items(200), maxsize=4))) == list(range(200))
+
+
+def test_bounded_stream_propagates_error():
+    async def failing():
+        yield 1
+        raise RuntimeError("boom")
+
+    async def run():
+        got = []
+        with pytest.raises(RuntimeError):
+            async for item in bounded_stream(failing()):
+                got.append(item)
+        assert got == [1]
+
+    asyncio.run(run())
+
+
+def test_bounded_stream_backpressure_and_close():
+    state = {"produced": 0, "closed": False}
+
+    async def endless():
+        try:
+            while True:
+                state["produced"] += 1
+                yield state["produced"]
+                await asyncio.sleep(0)
+        finally:
+            state["closed"] = True
+
+    async def run():
+        stream = bounded_stream(endless(), maxsize=2)
+        assert await stream.__anext__() == 1
+        for _ in range(50):
+            await asyncio.sleep(0)
+        # 队列满后生产者挂起，不再继续读取上游
+        assert state["produced"] <= 4
+        # 客户端断开：取消生产者并关闭上游
+        await stream.aclose()
+        assert state["closed"]
+        assert len(asyncio.all_tasks()) == 1
+
+    asyncio.run(run())
@@ -0,0 +1,32 @@
+import pytest
+
+pytest.importorskip("httpx")
+
+from mcp_hub import MCPHub, json_loads, sse_frame
+
+
+def _event_data(event: bytes):
+    assert event.startswith(b"data: ") and event.endswith(b"\n\n")
+    return json_loads(event[len(b"data: "):-2])
+
+
+def test_result_frame_to_sse():
+    message, done = MCPHub._stream_message(b'{"jsonrpc":"2.0","id":1,"result":{"text":"hi"}}')
+    assert isinstance(message, bytes)
+    assert not done
+    assert _event_data(sse_frame(message)) == {"success": True, "result": {"text": "hi"}}
+
+
+def test_error_frame_to_sse():
+    message, done = MCPHub._stream_message(b'{"jsonrpc":"2.0","id":1,"error":{"code":-1,"message":"boom"}}')
+    assert isinstance(message, bytes)
+    assert done
+    assert _event_data(sse_frame(message)) == {"success": False, "error": "boom"}
+
+
+def test_other_frames_pass_through():
+    for frame in (b"plain text", b'{"type":"status"}', b"[1, 2]"):
+        message, done = MCPHub._stream_message(frame)
+        assert message == frame
+        assert not done
+    assert sse_frame(b"a\nb") == b"data: a\ndata: b\n\n"
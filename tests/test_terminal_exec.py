@@ -0,0 +1,60 @@
+import asyncio
+import os
+import shutil
+
+import pytest
+
+pytest.importorskip("fastapi")
+
+if os.name != "posix" or shutil.which("sh") is None:
+    pytest.skip("需要 POSIX shell", allow_module_level=True)
+
+from terminal_mcp_server import TerminalMCPServer, split_simple_command
+
+
+def _write_tool(path):
+    path.write_text("#!/bin/sh\necho ok\n")
+    path.chmod(0o755)
+
+
+def _run(server, command):
+    return asyncio.run(server._run_command(command, 10))
+
+
+def test_split_simple_command():
+    assert split_simple_command("sh -c true") == ["sh", "-c", "true"]
+    assert split_simple_command("ls | wc -l") is None
+    assert split_simple_command("./local-tool") is None
+    assert split_simple_command("/bin/sh -c true") is None
+    assert split_simple_command("no-such-program-xyz") is None
+
+
+def test_relative_program_resolves_against_working_directory(tmp_path, monkeypatch):
+    process_cwd = tmp_path / "process"
+    work_dir = tmp_path / "work"
+    process_cwd.mkdir()
+    work_dir.mkdir()
+    _write_tool(process_cwd / "tool")
+    monkeypatch.chdir(process_cwd)
+
+    server = TerminalMCPServer()
+    server.working_directory = str(work_dir)
+    assert _run(server, "./tool").returncode == 127
+
+    _write_tool(work_dir / "tool")
+    result = _run(server, "./tool")
+    assert result.returncode == 0 and result.stdout.strip() == "ok"
+
+
+def test_program_removed_after_lookup_returns_127(tmp_path, monkeypatch):
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    _write_tool(bin_dir / "mytool-xyz")
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ.get('PATH', '')}")
+
+    server = TerminalMCPServer()
+    server.working_directory = str(tmp_path)
+    assert _run(server, "mytool-xyz").stdout.strip() == "ok"
+
+    (bin_dir / "mytool-xyz").unlink()
+    assert _run(server, "mytool-xyz").returncode == 127